@@ -1,12 +1,21 @@
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from app.metrics import timed
 
 # Chave secreta para assinatura do token JWT
 SECRET_KEY = "secretkey"
 security = HTTPBearer()
 
+# Validade, em segundos, de tokens sem "exp" no cache (na lista de revogação eles ficam para sempre)
+TOKEN_CACHE_TTL = 300
+
 def create_token(data: dict):
     """
     Gera um token JWT com expiração de 1 hora.
@@ -17,14 +26,110 @@ def create_token(data: dict):
     token = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
     return token
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+# Cache de tokens já verificados
+class TokenCache:
     """
-    Valida o token JWT recebido.
+    Cache LRU de payloads de tokens válidos, indexado pelo hash SHA-256 do token.
+    Cada entrada vale até o "exp" do próprio token. Tokens revogados ficam
+    em uma lista separada até expirarem (para sempre, se não tiverem "exp")
+    e nunca são servidos pelo cache.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+        self._revoked: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key: bytes) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]  # Token expirado: a decodificação vai rejeitá-lo
+            self.misses += 1
+            return None
+
+    def put(self, key: bytes, payload: dict):
+        if self.maxsize <= 0:
+            return
+        expires_at = payload.get("exp", time.time() + TOKEN_CACHE_TTL)
+        with self._lock:
+            if key in self._revoked:
+                return
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def revoke(self, key: bytes, expires_at: float):
+        with self._lock:
+            self._entries.pop(key, None)
+            now = time.time()
+            # Tokens revogados que já expiraram não precisam mais ser lembrados
+            for revoked, until in list(self._revoked.items()):
+                if until <= now:
+                    del self._revoked[revoked]
+            self._revoked[key] = expires_at
+
+    def is_revoked(self, key: bytes) -> bool:
+        until = self._revoked.get(key)
+        return until is not None and until > time.time()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                "revoked": len(self._revoked)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+token_cache = TokenCache()
+
+def decode_token(token: str) -> dict:
+    """
+    Decodifica e valida a assinatura do token, sem passar pelo cache.
     """
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
-        return payload
+        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Token inválido")
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Valida o token JWT recebido.
+    Tokens já verificados são atendidos pelo cache até expirarem.
+    """
+    key = TokenCache.key(credentials.credentials)
+    if token_cache.is_revoked(key):
+        raise HTTPException(status_code=401, detail="Token revogado")
+    payload = token_cache.get(key)
+    if payload is None:
+        with timed("token_decode"):
+            payload = decode_token(credentials.credentials)
+        token_cache.put(key, payload)
+    return dict(payload)
+
+def revoke_token(token: str):
+    """
+    Invalida imediatamente um token, inclusive se ele já estiver no cache.
+    Um token sem "exp" continuaria válido para sempre, então a revogação dele não expira.
+    """
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+        expires_at = float(claims.get("exp", float("inf")))
+    except jwt.InvalidTokenError:
+        expires_at = time.time() + TOKEN_CACHE_TTL
+    token_cache.revoke(TokenCache.key(token), expires_at)
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+def task_etag(task: dict) -> str:
+    """
+    ETag de uma tarefa, derivada do seu contador de versão.
+    """
+    return f'"{task["versao"]}"'
+
+
+def collection_etag(version: str) -> str:
+    """
+    ETag da coleção de tarefas, derivada do contador de modificações do armazenamento.
+    """
+    return f'"{version}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Verifica se um cabeçalho If-None-Match / If-Match contém a ETag informada.
+    Aceita "*", listas separadas por vírgula e ETags fracas (W/"...").
+    """
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def etag_version(header: str) -> Optional[int]:
+    """
+    Versão de tarefa contida em um cabeçalho If-Match gerado a partir de
+    task_etag. Retorna None para "*" (qualquer versão) e levanta ValueError
+    se o valor não for uma ETag de tarefa.
+    """
+    header = header.strip()
+    if header == "*":
+        return None
+    return int(header.removeprefix("W/").strip('"'))
+
+
+# Cache do JSON já serializado das tarefas mais acessadas
+class JSONCache:
+    """
+    Cache LRU de id -> (versao, corpo JSON). Uma entrada só é usada se a
+    versão pedida for a mesma que foi serializada, e os endpoints de escrita
+    removem a entrada da tarefa alterada.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, task_id: str, versao: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None or entry[0] != versao:
+                return None
+            self._entries.move_to_end(task_id)
+            return entry[1]
+
+    def put(self, task_id: str, versao: int, body: bytes):
+        with self._lock:
+            self._entries[task_id] = (versao, body)
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, task_id: str):
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
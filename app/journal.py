@@ -0,0 +1,642 @@
+import gc
+import glob
+import json
+import logging
+import mmap
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from itertools import compress
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.storage import SORT_FIELDS, MemoryTaskStore, _record_sort_value, _TaskRecord
+
+# Linhas lidas por chamada a json.loads ao carregar o journal
+LOAD_CHUNK = 10_000
+
+logger = logging.getLogger(__name__)
+
+# Marcador, na fila do journal, de troca para um novo arquivo de segmento
+_ROTATE = object()
+
+# Formatos no disco:
+# - journal-<seq>.ndjson: uma linha JSON por entrada, [seq, "p", tarefa] para
+#   criação/atualização (tarefa inteira) e [seq, "d", id] para exclusão; <seq> é a
+#   primeira sequência do segmento. Tarefas são gravadas como
+#   [id, titulo, descricao, estado, data_criacao, data_atualizacao, versao].
+# - snapshot-<seq>.cols: estado que reflete todas as entradas do journal com
+#   sequência <= seq, em colunas (veja _write_snapshot). As tarefas ficam na ordem
+#   de (data_criacao, id) e a coluna ordem_atualizacao guarda a permutação da ordem
+#   por data de modificação, para que os índices sejam montados sem ordenação.
+
+# Colunas do snapshot, na ordem em que são gravadas: nome e tipo ("json" para uma
+# lista JSON, ou o código de tipo de array com os valores binários em little-endian)
+SNAPSHOT_COLUMNS = (
+    ("id", "json"),
+    ("titulo", "json"),
+    ("descricao", "json"),
+    ("estado", "I"),  # Posição na lista "estados" do cabeçalho
+    ("data_criacao", "json"),  # ISO 8601
+    ("data_atualizacao", "json"),  # ISO 8601 ou null
+    ("versao", "q"),
+    ("ordem_atualizacao", "q"),  # Posições das tarefas em ordem de (data de modificação, id)
+)
+
+
+def encode_record(record: _TaskRecord) -> list:
+    return [
+        record.id,
+        record.titulo,
+        record.descricao,
+        record.estado,
+        record.data_criacao.isoformat(),
+        record.data_atualizacao.isoformat() if record.data_atualizacao else None,
+        record.versao,
+    ]
+
+
+def decode_record(values: list) -> _TaskRecord:
+    return _TaskRecord(
+        values[0],
+        values[1],
+        values[2],
+        values[3],
+        datetime.fromisoformat(values[4]),
+        datetime.fromisoformat(values[5]) if values[5] else None,
+        values[6],
+    )
+
+
+def _segment_seq(path: str) -> int:
+    return int(os.path.basename(path).split("-", 1)[1].split(".", 1)[0])
+
+
+def _read_lines(path: str) -> Iterator[list]:
+    """
+    Lê um arquivo NDJSON mapeado em memória, decodificando as linhas em blocos.
+    A leitura para na primeira linha incompleta ou corrompida (escrita
+    interrompida por uma queda).
+    """
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        lines = []
+        for line in iter(data.readline, b""):
+            if not line.endswith(b"\n"):
+                break
+            lines.append(line)
+            if len(lines) >= LOAD_CHUNK:
+                values = _decode_lines(lines)
+                yield from values
+                if len(values) < len(lines):
+                    return
+                lines = []
+        yield from _decode_lines(lines)
+
+
+def _decode_lines(lines: List[bytes]) -> List:
+    if not lines:
+        return []
+    try:
+        return json.loads(b"[" + b",".join(lines) + b"]")
+    except ValueError:
+        # Linha corrompida no bloco: decodifica uma a uma até ela
+        values = []
+        for line in lines:
+            try:
+                values.append(json.loads(line))
+            except ValueError:
+                break
+        return values
+
+
+def _truncate_torn_tail(path: str):
+    """
+    Remove bytes após a última quebra de linha, para que novas entradas
+    anexadas ao segmento não se misturem a uma linha incompleta.
+    """
+    with open(path, "r+b") as file:
+        size = file.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            file.seek(position - step)
+            block = file.read(step)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != size:
+            file.truncate(position)
+
+
+def _encode_column(kind: str, values) -> bytes:
+    if kind == "json":
+        return json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode()
+    column = array(kind, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _decode_column(kind: str, data) -> list:
+    if kind == "json":
+        return json.loads(bytes(data))
+    column = array(kind)
+    column.frombytes(data)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def _write_snapshot(file, seq: int, ordered: List[_TaskRecord], update_order: List[int]):
+    """
+    Grava um snapshot em colunas: uma linha JSON de cabeçalho (sequência,
+    quantidade, tabela de estados e tamanho de cada coluna) seguida das
+    colunas de SNAPSHOT_COLUMNS, uma após a outra. "ordered" deve estar em
+    ordem de (data_criacao, id).
+    """
+    estados: Dict[str, int] = {}
+    values = {
+        "id": [record.id for record in ordered],
+        "titulo": [record.titulo for record in ordered],
+        "descricao": [record.descricao for record in ordered],
+        "estado": [estados.setdefault(record.estado, len(estados)) for record in ordered],
+        "data_criacao": [record.data_criacao.isoformat() for record in ordered],
+        "data_atualizacao": [
+            record.data_atualizacao.isoformat() if record.data_atualizacao else None for record in ordered],
+        "versao": [record.versao for record in ordered],
+        "ordem_atualizacao": update_order,
+    }
+    encoded = [(name, kind, _encode_column(kind, values[name])) for name, kind in SNAPSHOT_COLUMNS]
+    header = {
+        "seq": seq,
+        "tarefas": len(ordered),
+        "estados": list(estados),
+        "colunas": [[name, kind, len(data)] for name, kind, data in encoded],
+    }
+    file.write(json.dumps(header, ensure_ascii=False).encode() + b"\n")
+    for _, _, data in encoded:
+        file.write(data)
+
+
+def _read_snapshot(path: str) -> Tuple[int, List[str], Dict[str, list]]:
+    """
+    Lê um snapshot em colunas (mapeado em memória), decodificando cada coluna
+    de uma vez. Retorna a sequência, a tabela de estados e as colunas.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header = json.loads(data.readline())
+        position = data.tell()
+        view = memoryview(data)
+        try:
+            columns = {}
+            for name, kind, size in header["colunas"]:
+                if position + size > len(data):
+                    raise ValueError(f"Snapshot truncado: {path}")
+                columns[name] = _decode_column(kind, view[position:position + size])
+                position += size
+        finally:
+            view.release()
+    if any(len(column) != header["tarefas"] for column in columns.values()):
+        raise ValueError(f"Snapshot inconsistente: {path}")
+    return header["seq"], header["estados"], columns
+
+
+def _records_from_columns(estados: List[str], columns: Dict[str, list]) -> List[_TaskRecord]:
+    """
+    Monta os registros a partir das colunas, trocando nelas as datas em
+    texto pelos objetos datetime (reaproveitados nas chaves dos índices).
+    """
+    parse = datetime.fromisoformat
+    columns["data_criacao"] = list(map(parse, columns["data_criacao"]))
+    columns["data_atualizacao"] = [parse(value) if value else None for value in columns["data_atualizacao"]]
+    return list(map(
+        _TaskRecord,
+        columns["id"],
+        columns["titulo"],
+        columns["descricao"],
+        map(estados.__getitem__, columns["estado"]),
+        columns["data_criacao"],
+        columns["data_atualizacao"],
+        columns["versao"],
+    ))
+
+
+def _snapshot_order(records: Dict[str, _TaskRecord], creation: List[Tuple[datetime, str]],
+                    update: List[Tuple[datetime, str]]) -> Tuple[List[_TaskRecord], List[int]]:
+    """
+    Ordem das tarefas no snapshot e permutação da ordem por data de
+    modificação, a partir de cópias dos índices gerais (que podem ter entradas
+    mortas). "records" pode estar sendo alterado: cada tarefa entra na versão
+    lida ao percorrer a cópia do índice de criação. Se a cópia do índice de
+    modificação não cobrir essas versões, a permutação é ordenada do zero.
+    """
+    ordered = [
+        record for value, task_id in creation
+        if (record := records.get(task_id)) is not None and record.data_criacao == value
+    ]
+    positions = {record.id: position for position, record in enumerate(ordered)}
+    update_order = [
+        position for value, task_id in update
+        if (position := positions.get(task_id)) is not None
+        and _record_sort_value(ordered[position], "data_atualizacao") == value
+    ]
+    if len(update_order) != len(ordered):
+        update_order = sorted(range(len(ordered)), key=lambda position: (
+            _record_sort_value(ordered[position], "data_atualizacao"), ordered[position].id))
+    return ordered, update_order
+
+
+def _indexes_from_snapshot(columns: Dict[str, list], estados: List[str], records: Dict[str, _TaskRecord],
+                           replaced: Dict[str, Optional[_TaskRecord]]):
+    """
+    Chaves dos índices ordenados, já em ordem, a partir da ordem gravada no
+    snapshot (depois de _records_from_columns). "replaced" tem, para cada
+    tarefa alterada pelo journal depois do snapshot, o registro que estava no
+    snapshot (ou None): as chaves dele saem e as do registro atual entram.
+    """
+    ids = columns["id"]
+    creations = columns["data_criacao"]
+    permutation = columns["ordem_atualizacao"]
+    update_values = [updated or created for updated, created in zip(columns["data_atualizacao"], creations)]
+    # Com até 256 estados, os códigos cabem em bytes e a partição por estado é feita em C
+    codes = array("B", columns["estado"]).tobytes() if len(estados) <= 256 else list(columns["estado"])
+    orders = {
+        "data_criacao": (list(zip(creations, ids)), codes),
+        "data_atualizacao": (list(zip(map(update_values.__getitem__, permutation), map(ids.__getitem__, permutation))),
+                             type(codes)(map(codes.__getitem__, permutation))),
+    }
+    indexes: Dict[Tuple[str, Optional[str]], list] = {}
+    for field, (keys, key_codes) in orders.items():
+        indexes[(field, None)] = keys
+        for estado, keys_for_estado in zip(estados, _split_by_code(keys, key_codes, len(estados))):
+            indexes[(field, estado)] = keys_for_estado
+
+    removed: Dict[Tuple[str, Optional[str]], list] = {}
+    added: Dict[Tuple[str, Optional[str]], list] = {}
+    for task_id, old in replaced.items():
+        for changes, record in ((removed, old), (added, records.get(task_id))):
+            if record is None:
+                continue
+            for field in SORT_FIELDS:
+                key = (_record_sort_value(record, field), task_id)
+                changes.setdefault((field, None), []).append(key)
+                changes.setdefault((field, record.estado), []).append(key)
+    for name in removed.keys() | added.keys():
+        indexes[name] = _merge_changes(indexes.get(name, []), removed.get(name, []), added.get(name, []))
+    return indexes
+
+
+def _merge_changes(keys: list, removed: list, added: list) -> list:
+    """
+    Lista ordenada "keys" sem as chaves de "removed" e com as de "added",
+    copiando os trechos entre as posições alteradas em vez de reordenar tudo.
+    """
+    positions = set()
+    for key in removed:
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            positions.add(position)
+    kept, previous = [], 0
+    for position in sorted(positions):
+        kept += keys[previous:position]
+        previous = position + 1
+    kept += keys[previous:]
+    result, previous = [], 0
+    for key in sorted(added):
+        position = bisect_left(kept, key, previous)
+        result += kept[previous:position]
+        result.append(key)
+        previous = position
+    result += kept[previous:]
+    return result
+
+
+def _split_by_code(keys: list, codes, count: int) -> List[list]:
+    """
+    Separa as chaves pelo código de estado correspondente, mantendo a ordem.
+    """
+    if isinstance(codes, bytes):
+        result = []
+        for code in range(count):
+            table = bytearray(256)
+            table[code] = 1
+            result.append(list(compress(keys, codes.translate(table))))
+        return result
+    result = [[] for _ in range(count)]
+    appends = [keys_for_code.append for keys_for_code in result]
+    for key, code in zip(keys, codes):
+        appends[code](key)
+    return result
+
+
+# Journal de escrita antecipada com group commit
+class Journal:
+    """
+    Recebe as entradas já na ordem em que foram aplicadas na memória e uma
+    thread as grava em disco em grupos: tudo que chegou enquanto o fsync
+    anterior acontecia é gravado e sincronizado de uma só vez.
+    """
+
+    def __init__(self, directory: str, next_seq: int, fsync: bool = True):
+        self.directory = directory
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[int, object]] = []
+        self._next = next_seq
+        self._synced = next_seq - 1
+        self._closing = False
+        self._error: Optional[BaseException] = None
+        self._file = self._open_segment(next_seq)
+        self._thread = threading.Thread(target=self._run, name="task-journal", daemon=True)
+        self._thread.start()
+
+    @property
+    def last_seq(self) -> int:
+        return self._next - 1
+
+    def _open_segment(self, start: int):
+        return open(os.path.join(self.directory, f"journal-{start:020d}.ndjson"), "ab")
+
+    def append_many(self, entries: List[Tuple[str, object]]) -> int:
+        """
+        Enfileira as entradas (op, payload) de uma operação inteira e retorna a
+        sequência da última. Deve ser chamado com o lock de escrita do
+        armazenamento, para manter a ordem de aplicação. Depois de uma falha de
+        gravação, levanta RuntimeError sem enfileirar nenhuma delas.
+        """
+        # A serialização acontece fora de _cond; sob ele só entram as sequências
+        bodies = [json.dumps([op, payload], ensure_ascii=False, separators=(",", ":")).encode()[1:]
+                  for op, payload in entries]
+        with self._cond:
+            self._raise_if_failed()
+            first = self._next
+            self._next += len(bodies)
+            self._pending.extend((seq, b"[%d,%s\n" % (seq, body)) for seq, body in enumerate(bodies, first))
+            self._cond.notify()
+            return self._next - 1
+
+    def rotate(self) -> int:
+        """
+        Pede a troca de segmento: entradas posteriores vão para um arquivo novo.
+        Retorna a sequência do marcador; depois de wait() nela, o segmento
+        antigo está completo, sincronizado e fechado.
+        """
+        with self._cond:
+            seq = self._next
+            self._next += 1
+            self._raise_if_failed()
+            self._pending.append((seq, _ROTATE))
+            self._cond.notify()
+            return seq
+
+    def wait(self, seq: Optional[int] = None):
+        """
+        Bloqueia até que a entrada seq (por padrão, a última enfileirada) esteja em disco.
+        """
+        with self._cond:
+            seq = self.last_seq if seq is None else seq
+            while self._synced < seq and self._error is None:
+                self._cond.wait()
+            self._raise_if_failed()
+
+    def check(self):
+        """
+        Levanta RuntimeError se a thread de gravação já falhou.
+        """
+        with self._cond:
+            self._raise_if_failed()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError("Falha ao gravar o journal de tarefas") from self._error
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        self._file.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                batch, self._pending = self._pending, []
+                if not batch:
+                    return
+            try:
+                for seq, line in batch:
+                    if line is _ROTATE:
+                        self._sync()
+                        self._file.close()
+                        self._file = self._open_segment(seq + 1)
+                    else:
+                        self._file.write(line)
+                self._sync()
+            except BaseException as exc:
+                with self._cond:
+                    self._error = exc
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._synced = batch[-1][0]
+                self._cond.notify_all()
+
+    def _sync(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+
+# Armazenamento em memória com durabilidade por journal e snapshots
+class JournaledTaskStore(MemoryTaskStore):
+    """
+    MemoryTaskStore que registra cada criação, atualização e exclusão em um
+    journal em disco e grava snapshots compactos periodicamente, em uma
+    thread de fundo. Na inicialização, carrega o snapshot mais recente
+    (mapeado em memória) e reaplica apenas as entradas do journal posteriores
+    a ele, montando os índices uma única vez ao final.
+
+    Com wait_for_sync=True (padrão), cada escrita só retorna depois do fsync
+    do grupo em que entrou; com False, retorna logo após aplicar na memória
+    e o journal é sincronizado logo em seguida, em segundo plano.
+
+    Se a gravação do journal falhar, as escritas seguintes levantam
+    RuntimeError sem alterar a memória; as que já estavam na fila continuam
+    visíveis, mas podem não ter chegado ao disco.
+    """
+
+    def __init__(self, directory: str, wait_for_sync: bool = True, fsync: bool = True,
+                 snapshot_interval: float = 300.0, snapshot_every: int = 1_000_000):
+        super().__init__()
+        self.directory = directory
+        self.wait_for_sync = wait_for_sync
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        last_seq = self._recover()
+        self._journal = Journal(directory, last_seq + 1, fsync=fsync)
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_seq = last_seq
+        self._last_snapshot = time.monotonic()
+        self._stop = threading.Event()
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, name="task-snapshot", daemon=True)
+        self._snapshotter.start()
+
+    # Recuperação
+
+    def _recover(self) -> int:
+        """
+        Carrega o snapshot mais recente e o journal posterior a ele.
+        Retorna a maior sequência encontrada.
+        """
+        # Milhões de objetos novos e nenhum ciclo: o coletor de ciclos só atrasaria a carga
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._load_files()
+        finally:
+            # Os objetos carregados vão para a geração permanente: sem ciclos,
+            # eles nunca precisarão ser percorridos pelo coletor
+            gc.freeze()
+            if gc_enabled:
+                gc.enable()
+
+    def _load_files(self) -> int:
+        records: Dict[str, _TaskRecord] = {}
+        snapshot = None
+        last_seq = 0
+        snapshots = sorted(glob.glob(os.path.join(self.directory, "snapshot-*.cols")), key=_segment_seq)
+        if snapshots:
+            last_seq, estados, columns = _read_snapshot(snapshots[-1])
+            ordered = _records_from_columns(estados, columns)
+            records = dict(zip(columns["id"], ordered))
+            snapshot = (columns, estados)
+        snapshot_seq = last_seq
+        replaced: Dict[str, Optional[_TaskRecord]] = {}  # Tarefas alteradas depois do snapshot: versão do snapshot
+        for path in sorted(glob.glob(os.path.join(self.directory, "journal-*.ndjson")), key=_segment_seq):
+            _truncate_torn_tail(path)
+            for seq, op, payload in _read_lines(path):
+                if seq <= snapshot_seq:
+                    continue
+                task_id = payload[0] if op == "p" else payload
+                if task_id not in replaced:
+                    replaced[task_id] = records.get(task_id)
+                if op == "p":
+                    records[task_id] = decode_record(payload)
+                else:
+                    records.pop(task_id, None)
+                last_seq = max(last_seq, seq)
+        indexes = _indexes_from_snapshot(*snapshot, records, replaced) if snapshot else None
+        self._bulk_load(records, indexes)
+        return last_seq
+
+    # Registro das escritas no journal: sempre com o lock de escrita e antes
+    # de alterar a memória, com todas as entradas da operação de uma só vez.
+    # Se o journal falhou, a operação inteira é recusada sem alterar nada.
+
+    def _log_locked(self, changes: List[Tuple[str, object]]):
+        self._journal.append_many([(op, encode_record(value) if op == "p" else value)
+                                   for op, value in changes])
+
+    def _durable(self, result):
+        if self.wait_for_sync:
+            self._journal.wait()
+        return result
+
+    def add(self, task: dict) -> dict:
+        return self._durable(super().add(task))
+
+    def update(self, task_id: str, fields: dict, expected_version: Optional[int] = None) -> Optional[dict]:
+        return self._durable(super().update(task_id, fields, expected_version))
+
+    def delete(self, task_id: str) -> bool:
+        return self._durable(super().delete(task_id))
+
+    def add_many(self, tasks: List[dict]) -> List[dict]:
+        return self._durable(super().add_many(tasks))
+
+    def update_many(self, updates: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        return self._durable(super().update_many(updates))
+
+    def delete_many(self, task_ids: List[str]) -> List[bool]:
+        return self._durable(super().delete_many(task_ids))
+
+    # Snapshots
+
+    def snapshot(self) -> str:
+        """
+        Grava um snapshot do estado atual e remove o journal e os snapshots
+        que ele torna desnecessários. Retorna o caminho do snapshot.
+        """
+        with self._snapshot_lock:
+            # Só a troca de segmento precisa do lock de escrita. O estado é lido
+            # depois, com as escritas correndo: ele contém tudo até seq e talvez
+            # parte das entradas seguintes, que na recuperação são reaplicadas
+            # por cima (cada entrada traz a tarefa inteira, ou só remove).
+            with self._write_lock:
+                seq = self._journal.rotate()
+            self._journal.wait(seq)
+            ordered, update_order = _snapshot_order(
+                self._records, self._index_keys_copy(("data_criacao", None)),
+                self._index_keys_copy(("data_atualizacao", None)))
+
+            path = os.path.join(self.directory, f"snapshot-{seq:020d}.cols")
+            temporary = path + ".tmp"
+            with open(temporary, "wb") as file:
+                _write_snapshot(file, seq, ordered, update_order)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, path)
+            self._fsync_directory()
+
+            # O snapshot cobre tudo até seq: segmentos e snapshots anteriores podem sair
+            for old in glob.glob(os.path.join(self.directory, "journal-*.ndjson")):
+                if _segment_seq(old) <= seq:
+                    os.remove(old)
+            for old in glob.glob(os.path.join(self.directory, "snapshot-*")):
+                if not old.endswith(".tmp") and _segment_seq(old) < seq:
+                    os.remove(old)
+            self._snapshot_seq = seq
+            self._last_snapshot = time.monotonic()
+            return path
+
+    def _index_keys_copy(self, name: Tuple[str, Optional[str]]) -> List[Tuple[datetime, str]]:
+        index = self._indexes.get(name)
+        return index.copy_keys() if index is not None else []
+
+    def _fsync_directory(self):
+        if hasattr(os, "O_DIRECTORY"):  # Indisponível no Windows
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(min(1.0, self.snapshot_interval)):
+            pending = self._journal.last_seq - self._snapshot_seq
+            elapsed = time.monotonic() - self._last_snapshot
+            if pending >= self.snapshot_every or (pending > 0 and elapsed >= self.snapshot_interval):
+                try:
+                    self.snapshot()
+                except Exception:
+                    # Tenta de novo depois de um intervalo inteiro, sem derrubar a thread
+                    logger.exception("Falha ao gravar o snapshot de tarefas em %s", self.directory)
+                    self._stop.wait(self.snapshot_interval)
+
+    def close(self):
+        """
+        Interrompe os snapshots periódicos e grava o que restar do journal.
+        """
+        self._stop.set()
+        self._snapshotter.join()
+        self._journal.close()
@@ -1,14 +1,26 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from typing import Iterator, Literal, Optional, List
 from datetime import datetime, timezone
-from uuid import uuid4  # Importação para gerar IDs únicos para as tarefas
+from uuid import UUID, uuid4  # Importação para gerar IDs únicos para as tarefas
+import base64
+import json
+import os
+from app.http_cache import JSONCache, collection_etag, etag_matches, etag_version, task_etag
+from app.metrics import MetricsMiddleware, ProfiledRoute, registry, timed
+from app.storage import TaskStore, VersionConflictError, sort_value, store_from_env
 
 # Inicialização da aplicação FastAPI
 app = FastAPI()
+app.router.route_class = ProfiledRoute  # Permite perfilar só a thread do endpoint (X-Profile)
+app.add_middleware(MetricsMiddleware)  # Latência por rota, tamanho das respostas e requisições em andamento
 
-# Simulação de um banco de dados na memória
-tasks_db = []
+# Armazenamento das tarefas: em memória (padrão) ou SQLite, conforme TASKS_BACKEND
+tasks_db: TaskStore = store_from_env()
+
+# JSON já serializado das tarefas mais lidas, invalidado a cada escrita
+json_cache = JSONCache()
 
 # Classe base para representar os dados de uma tarefa
 class TaskBase(BaseModel):
@@ -26,9 +38,28 @@ class TaskResponse(TaskBase):
     data_criacao: datetime  # Data de criação da tarefa
     data_atualizacao: Optional[datetime] = None  # Data da última atualização da tarefa (opcional)
 
+# Serializador de listas de tarefas, usado sem passar pelo response_model
+task_list_adapter = TypeAdapter(List[TaskResponse])
+
+# Quantidade máxima de itens aceitos por requisição nos endpoints em lote
+BULK_MAX_ITEMS = 50_000
+
+# Item de atualização em lote: apenas os campos enviados são alterados
+class TaskBulkUpdate(BaseModel):
+    id: str
+    titulo: Optional[str] = None
+    descricao: Optional[str] = None
+    estado: Optional[str] = None
+
+# Resultado de cada item de uma operação em lote
+class BulkItemResult(BaseModel):
+    id: str
+    status: int  # Código HTTP equivalente ao da operação individual
+    task: Optional[TaskResponse] = None
+
 # Endpoint para criar uma nova tarefa
 @app.post("/tasks/", response_model=TaskResponse, summary="Criar tarefas")
-def create_task(task: TaskCreate):
+def create_task(task: TaskCreate, response: Response):
     """
     Cria uma nova tarefa com os dados fornecidos.
     Gera automaticamente um ID único e registra a data de criação.
@@ -41,41 +72,213 @@ def create_task(task: TaskCreate):
         "data_criacao": datetime.now(timezone.utc),  # Data atual com fuso horário UTC
         "data_atualizacao": None,  # Inicialmente sem data de atualização
     }
-    tasks_db.append(new_task)  # Adiciona a nova tarefa ao banco de dados
+    with timed("store_write"):
+        new_task = tasks_db.add(new_task)  # Adiciona a nova tarefa ao banco de dados
+    response.headers["ETag"] = task_etag(new_task)
     return new_task
 
-# Endpoint para listar todas as tarefas
-@app.get("/tasks/", response_model=List[TaskResponse], summary="Listar todas as tarefas")
-def list_tasks():
+# Quantidade de tarefas lidas do armazenamento por vez no modo streaming
+STREAM_CHUNK = 1000
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Datas sem fuso horário são tratadas como UTC.
+    """
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def encode_cursor(task: dict, ordenar_por: str) -> str:
+    """
+    Gera um cursor opaco a partir da chave de ordenação (valor, id) da tarefa.
+    """
+    key = [sort_value(task, ordenar_por).isoformat(), task["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor: str):
+    """
+    Recupera a chave (valor, id) de um cursor gerado por encode_cursor.
+    """
+    try:
+        value, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return as_utc(datetime.fromisoformat(value)), str(task_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+# Endpoint para listar as tarefas
+@app.get("/tasks/", response_model=List[TaskResponse], summary="Listar tarefas")
+def list_tasks(
+    limit: int = Query(100, ge=1, le=1000, description="Tamanho máximo da página"),
+    after: Optional[str] = Query(None, description="Cursor retornado em X-Next-Cursor"),
+    estado: Optional[str] = None,
+    criado_de: Optional[datetime] = None,
+    criado_ate: Optional[datetime] = None,
+    atualizado_de: Optional[datetime] = None,
+    atualizado_ate: Optional[datetime] = None,
+    ordenar_por: Literal["data_criacao", "data_atualizacao"] = "data_criacao",
+    ordem: Literal["asc", "desc"] = "asc",
+    formato: Literal["json", "ndjson"] = "json",
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Retorna as tarefas paginadas por cursor, com filtros por estado e por
+    intervalos de datas ([de, ate)). Quando há mais resultados, o cursor da
+    próxima página vem no cabeçalho X-Next-Cursor.
+    Com formato=ndjson, todas as tarefas a partir do cursor são enviadas
+    em streaming, uma por linha, sem montar a resposta inteira em memória.
+    A ETag acompanha o contador de modificações do armazenamento: se nada
+    mudou desde a ETag enviada em If-None-Match, a resposta é 304 sem corpo.
+    """
+    with timed("store_lookup"):
+        etag = collection_etag(tasks_db.version())  # Lida antes dos dados, nunca depois
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    filters = dict(
+        estado=estado,
+        criado_de=as_utc(criado_de),
+        criado_ate=as_utc(criado_ate),
+        atualizado_de=as_utc(atualizado_de),
+        atualizado_ate=as_utc(atualizado_ate),
+        ordenar_por=ordenar_por,
+        desc=ordem == "desc",
+    )
+    cursor = decode_cursor(after) if after else None
+
+    if formato == "ndjson":
+        return StreamingResponse(stream_tasks(cursor, filters), media_type="application/x-ndjson",
+                                 headers={"ETag": etag})
+
+    headers = {"ETag": etag}
+    with timed("store_lookup"):
+        tasks = tasks_db.page(limit + 1, after=cursor, **filters)  # Uma a mais indica se há próxima página
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(tasks[-1], ordenar_por)
+    with timed("serialization"):
+        body = task_list_adapter.dump_json(task_list_adapter.validate_python(tasks))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def stream_tasks(cursor, filters: dict) -> Iterator[bytes]:
     """
-    Retorna a lista de todas as tarefas armazenadas no banco de dados.
+    Lê as tarefas do armazenamento em blocos e envia cada bloco em NDJSON
+    (uma tarefa por linha) assim que é serializado.
     """
-    return tasks_db
+    while True:
+        with timed("store_lookup"):
+            tasks = tasks_db.page(STREAM_CHUNK, after=cursor, **filters)
+        with timed("serialization"):
+            chunk = b"".join(TaskResponse.model_validate(task).model_dump_json().encode() + b"\n" for task in tasks)
+        yield chunk
+        if len(tasks) < STREAM_CHUNK:
+            return
+        last = tasks[-1]
+        cursor = (sort_value(last, filters["ordenar_por"]), last["id"])
+
+# Endpoint para criar várias tarefas de uma vez
+@app.post("/tasks/bulk", response_model=List[BulkItemResult], summary="Criar tarefas em lote")
+def create_tasks_bulk(tasks: List[TaskCreate] = Body(..., min_length=1, max_length=BULK_MAX_ITEMS)):
+    """
+    Cria todas as tarefas enviadas em uma única operação atômica.
+    Os IDs são gerados a partir de um único bloco de bytes aleatórios e
+    todas as tarefas do lote recebem a mesma data de criação.
+    """
+    now = datetime.now(timezone.utc)
+    random = os.urandom(16 * len(tasks))
+    new_tasks = [
+        {
+            "id": str(UUID(bytes=random[16 * i:16 * i + 16], version=4)),
+            "titulo": task.titulo,
+            "descricao": task.descricao,
+            "estado": task.estado,
+            "data_criacao": now,
+            "data_atualizacao": None,
+        }
+        for i, task in enumerate(tasks)
+    ]
+    return [{"id": t["id"], "status": 201, "task": t} for t in tasks_db.add_many(new_tasks)]
+
+# Endpoint para atualizar várias tarefas de uma vez
+@app.patch("/tasks/bulk", response_model=List[BulkItemResult], summary="Atualizar tarefas em lote")
+def update_tasks_bulk(items: List[TaskBulkUpdate] = Body(..., min_length=1, max_length=BULK_MAX_ITEMS)):
+    """
+    Atualiza parcialmente as tarefas enviadas em uma única operação atômica.
+    Tarefas inexistentes recebem status 404 sem impedir as demais.
+    """
+    now = datetime.now(timezone.utc)
+    updates = []
+    for item in items:
+        fields = item.model_dump(exclude_unset=True, exclude={"id"})
+        fields = {k: v for k, v in fields.items() if v is not None or k == "descricao"}  # Título e estado são obrigatórios
+        fields["data_atualizacao"] = now
+        updates.append((item.id, fields))
+    results = tasks_db.update_many(updates)
+    for item in items:
+        json_cache.invalidate(item.id)
+    return [
+        {"id": item.id, "status": 200, "task": task} if task else {"id": item.id, "status": 404}
+        for item, task in zip(items, results)
+    ]
+
+# Endpoint para deletar várias tarefas de uma vez
+@app.delete("/tasks/bulk", response_model=List[BulkItemResult], summary="Deletar tarefas em lote")
+def delete_tasks_bulk(ids: List[str] = Body(..., min_length=1, max_length=BULK_MAX_ITEMS)):
+    """
+    Remove as tarefas com os IDs enviados em uma única operação atômica.
+    """
+    results = tasks_db.delete_many(ids)
+    for task_id in ids:
+        json_cache.invalidate(task_id)
+    return [{"id": task_id, "status": 200 if found else 404} for task_id, found in zip(ids, results)]
 
 # Endpoint para visualizar os detalhes de uma tarefa específica
 @app.get("/tasks/{task_id}", response_model=TaskResponse, summary="Visualizar uma tarefa específica")
-def get_task(task_id: str):
+def get_task(task_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Busca uma tarefa específica pelo ID.
-    Retorna erro 404 caso a tarefa não seja encontrada.
+    Retorna erro 404 caso a tarefa não seja encontrada, e 304 sem corpo
+    se a ETag enviada em If-None-Match ainda corresponder à versão atual.
     """
-    task = next((t for t in tasks_db if t["id"] == task_id), None)
+    with timed("store_lookup"):
+        task = tasks_db.get(task_id)  # Busca pelo índice de IDs
     if not task:
         raise HTTPException(status_code=404, detail="Tarefa não encontrada")
-    return task
+    etag = task_etag(task)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    body = json_cache.get(task_id, task["versao"])
+    if body is None:
+        with timed("serialization"):
+            body = TaskResponse.model_validate(task).model_dump_json().encode()
+        json_cache.put(task_id, task["versao"], body)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 # Endpoint para atualizar uma tarefa existente
 @app.put("/tasks/{task_id}", response_model=TaskResponse, summary="Atualizar uma tarefa existente")
-def update_task(task_id: str, updated_task: TaskCreate):
+def update_task(task_id: str, updated_task: TaskCreate, response: Response,
+                if_match: Optional[str] = Header(None)):
     """
     Atualiza os dados de uma tarefa existente com base no ID fornecido.
     Atualiza também a data de modificação da tarefa.
+    Com If-Match, a atualização só é aplicada se a tarefa ainda estiver na
+    versão da ETag enviada; caso contrário, retorna erro 412.
     """
-    task = next((t for t in tasks_db if t["id"] == task_id), None)
+    try:
+        expected_version = etag_version(if_match) if if_match else None
+    except ValueError:
+        raise HTTPException(status_code=412, detail="ETag inválida em If-Match")
+    fields = updated_task.model_dump()  # Novos dados da tarefa
+    fields["data_atualizacao"] = datetime.now(timezone.utc)  # Define a data de atualização
+    try:
+        with timed("store_write"):
+            task = tasks_db.update(task_id, fields, expected_version=expected_version)
+    except VersionConflictError as conflict:
+        raise HTTPException(status_code=412, detail="A tarefa foi alterada por outra requisição",
+                            headers={"ETag": task_etag(conflict.task)})
+    json_cache.invalidate(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Tarefa não encontrada")
-    task.update(updated_task.model_dump())  # Atualiza os dados da tarefa
-    task["data_atualizacao"] = datetime.now(timezone.utc)  # Define a data de atualização
+    response.headers["ETag"] = task_etag(task)
     return task
 
 # Endpoint para deletar uma tarefa existente
@@ -84,6 +287,15 @@ def delete_task(task_id: str):
     """
     Remove uma tarefa do banco de dados com base no ID fornecido.
     """
-    global tasks_db
-    tasks_db = [t for t in tasks_db if t["id"] != task_id]  # Remove a tarefa pelo ID
+    with timed("store_write"):
+        tasks_db.delete(task_id)  # Remove a tarefa pelo ID
+    json_cache.invalidate(task_id)
     return {"message": "Tarefa deletada com sucesso!"}
+
+# Endpoint de métricas no formato do Prometheus
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """
+    Expõe as métricas coletadas no formato de texto do Prometheus.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
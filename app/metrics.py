@@ -0,0 +1,339 @@
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi.routing import APIRoute
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Limites (em bytes) dos buckets do histograma de tamanho de resposta
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Métrica base: um valor (ou conjunto de valores) por combinação de rótulos
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+# Contador que só cresce
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}"
+            for values, value in items
+        ]
+
+
+# Valor que sobe e desce
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+# Histograma com buckets fixos
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        # Por rótulo: [contagem por bucket (+Inf no fim), soma]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, *label_values: str) -> "_Timer":
+        return _Timer(self, label_values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(values, list(entry[0]), entry[1]) for values, entry in self._values.items()]
+        lines = self.header()
+        for values, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+# Cronômetro usado como gerenciador de contexto
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram: Histogram, label_values: Tuple[str, ...]):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+# Conjunto de métricas expostas em /metrics
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Todas as métricas no formato de texto do Prometheus (versão 0.0.4).
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP.", ("method", "route", "status")))
+requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requisições HTTP em andamento."))
+response_size = registry.register(Histogram(
+    "http_response_size_bytes", "Tamanho do corpo das respostas HTTP.", ("method", "route"), SIZE_BUCKETS))
+phase_duration = registry.register(Histogram(
+    "task_phase_duration_seconds", "Duração das fases internas das requisições.", ("phase",)))
+
+
+def timed(phase: str) -> _Timer:
+    """
+    Mede a duração de uma fase interna (ex.: "token_decode", "store_lookup", "serialization").
+    """
+    return phase_duration.time(phase)
+
+
+# Perfilador por amostragem, ativado por requisição
+class SamplingProfiler:
+    """
+    Enquanto ativo, amostra periodicamente as pilhas das threads registradas
+    com watch() (as que executam o endpoint da requisição perfilada) e as
+    acumula no formato "collapsed" (uma pilha por linha, frames separados
+    por ";"), pronto para flamegraph.pl ou speedscope.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks: _StackCounter = _StackCounter()
+        self.thread_ids: Set[int] = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @contextmanager
+    def watch(self):
+        """
+        Amostra a thread atual enquanto o bloco executa.
+        """
+        thread_id = threading.get_ident()
+        self.thread_ids.add(thread_id)
+        try:
+            yield
+        finally:
+            self.thread_ids.discard(thread_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            watched = set(self.thread_ids)
+            if not watched:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in watched:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+# Perfilador da requisição atual, definido pelo MetricsMiddleware
+_active_profiler: ContextVar[Optional[SamplingProfiler]] = ContextVar("active_profiler", default=None)
+
+
+def _profiled(endpoint):
+    """
+    Envolve um endpoint para que a thread que o executa seja amostrada
+    quando a requisição estiver sendo perfilada. Endpoints síncronos rodam
+    no pool de threads; o contexto (e portanto _active_profiler) vai junto.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            profiler = _active_profiler.get()
+            if profiler is None:
+                return await endpoint(*args, **kwargs)
+            with profiler.watch():
+                return await endpoint(*args, **kwargs)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            profiler = _active_profiler.get()
+            if profiler is None:
+                return endpoint(*args, **kwargs)
+            with profiler.watch():
+                return endpoint(*args, **kwargs)
+    return wrapper
+
+
+# Rota cujo endpoint pode ser perfilado por requisição
+class ProfiledRoute(APIRoute):
+    """
+    Use como route_class do roteador (app.router.route_class = ProfiledRoute)
+    para que o perfil de X-Profile contenha só a thread do endpoint da
+    requisição. Endpoints assíncronos rodam na thread do event loop, que é
+    compartilhada: nas esperas (await), outras requisições podem aparecer.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+# Middleware ASGI de instrumentação
+class MetricsMiddleware:
+    """
+    Registra, para cada requisição HTTP, a latência por rota e status, o
+    tamanho da resposta e as requisições em andamento. A rota é o modelo
+    declarado (ex.: /tasks/{task_id}), para não criar uma série por ID.
+
+    Se METRICS_PROFILING=1 e a requisição trouxer o cabeçalho "X-Profile: 1",
+    o endpoint (das rotas ProfiledRoute) é executado sob o SamplingProfiler
+    e as pilhas são gravadas em METRICS_PROFILE_DIR; o caminho do arquivo
+    volta no cabeçalho X-Profile-File, e o arquivo é gravado antes da última
+    parte do corpo da resposta.
+    """
+
+    def __init__(self, app, profiling: Optional[bool] = None, profile_dir: Optional[str] = None):
+        self.app = app
+        self.profiling = os.getenv("METRICS_PROFILING") == "1" if profiling is None else profiling
+        self.profile_dir = profile_dir or os.getenv("METRICS_PROFILE_DIR", "profiles")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+        size = 0
+        profiler = profile_path = token = None
+        if self.profiling and (b"x-profile", b"1") in scope.get("headers", ()):
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profile_path = os.path.join(
+                self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident()}-{time.monotonic_ns()}.folded")
+            profiler = SamplingProfiler()
+            profiler.start()
+            token = _active_profiler.set(profiler)
+
+        def finish_profile():
+            nonlocal profiler
+            if profiler is not None:
+                profiler.stop()
+                profiler.dump(profile_path)
+                profiler = None
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                if profile_path:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-profile-file", profile_path.encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    finish_profile()  # O arquivo existe quando o cliente recebe a resposta inteira
+            await send(message)
+
+        requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            request_duration.observe(elapsed, scope["method"], route, status)
+            response_size.observe(size, scope["method"], route)
+            finish_profile()
+            if token is not None:
+                _active_profiler.reset(token)
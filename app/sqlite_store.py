@@ -0,0 +1,392 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from app.storage import TASK_FIELDS, TaskStore, VersionConflictError
+
+# Mapeamento entre os campos da API e as colunas da tabela "tasks"
+COLUMNS = {
+    "id": "id",
+    "titulo": "title",
+    "descricao": "description",
+    "estado": "status",
+    "data_criacao": "created_at",
+    "data_atualizacao": "updated_at",
+    "versao": "version",
+}
+_SELECT_COLUMNS = ", ".join(COLUMNS[field] for field in TASK_FIELDS)
+
+# Mesmo esquema de test.db, com o ID em texto para guardar os UUIDs gerados pela API
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        id TEXT NOT NULL PRIMARY KEY,
+        title VARCHAR NOT NULL,
+        description VARCHAR,
+        status VARCHAR NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME,
+        version INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    # Contador de modificações da tabela, incrementado em toda transação de escrita
+    "CREATE TABLE IF NOT EXISTS tasks_meta (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO tasks_meta (id, version) VALUES (1, 0)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_title ON tasks (title)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_status ON tasks (status)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_created_at ON tasks (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_status_created_at ON tasks (status, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_modified_at ON tasks (COALESCE(updated_at, created_at), id)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_status_modified_at ON tasks (status, COALESCE(updated_at, created_at), id)",
+)
+
+# Expressão de ordenação de cada campo; precisa ser idêntica à dos índices acima
+SORT_EXPRESSIONS = {
+    "data_criacao": "created_at",
+    "data_atualizacao": "COALESCE(updated_at, created_at)",
+}
+
+# Comandos SQL fixos: o módulo sqlite3 mantém cada um preparado no cache da conexão
+SQL_INSERT = f"INSERT INTO tasks ({_SELECT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_GET = f"SELECT {_SELECT_COLUMNS} FROM tasks WHERE id = ?"
+SQL_DELETE = "DELETE FROM tasks WHERE id = ?"
+SQL_COUNT = "SELECT COUNT(*) FROM tasks"
+SQL_VERSION = "SELECT version FROM tasks_meta WHERE id = 1"
+SQL_BUMP_VERSION = "UPDATE tasks_meta SET version = version + 1 WHERE id = 1"
+
+# Quantidade de linhas lidas por consulta ao percorrer a tabela
+ITER_CHUNK = 1000
+
+
+def to_db_datetime(value: Optional[datetime]) -> Optional[str]:
+    """
+    Converte uma data para texto ISO 8601 em UTC com tamanho fixo,
+    de forma que a ordem alfabética coincida com a ordem cronológica.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+def from_db_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _to_row(task: dict) -> tuple:
+    return (
+        task["id"],
+        task["titulo"],
+        task.get("descricao"),
+        task["estado"],
+        to_db_datetime(task["data_criacao"]),
+        to_db_datetime(task.get("data_atualizacao")),
+        task.get("versao") or 1,
+    )
+
+
+def _from_row(row: tuple) -> dict:
+    task = dict(zip(TASK_FIELDS, row))
+    task["data_criacao"] = from_db_datetime(task["data_criacao"])
+    task["data_atualizacao"] = from_db_datetime(task["data_atualizacao"])
+    return task
+
+
+# Pool limitado de conexões SQLite
+class ConnectionPool:
+    """
+    Reaproveita até max_size conexões entre as threads do servidor.
+    Quando todas estão em uso, quem pede uma conexão espera até timeout segundos.
+    """
+
+    def __init__(self, path: str, max_size: int = 8, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,  # Transações controladas explicitamente com BEGIN
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")  # Leituras não bloqueiam escritas
+        conn.execute("PRAGMA synchronous=NORMAL")  # Seguro com WAL e bem mais rápido que FULL
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("Nenhuma conexão disponível no pool")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Abre uma transação de escrita (BEGIN IMMEDIATE) e faz commit ao final.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+
+# Agrupador de inserções concorrentes
+class WriteBatcher:
+    """
+    Recebe inserções de várias threads e as grava em lotes, cada lote em uma
+    única transação. Quem chama espera apenas o commit do lote em que entrou.
+    """
+
+    def __init__(self, transaction, max_batch: int = 500):
+        self._transaction = transaction
+        self._max_batch = max_batch
+        self._pending: "queue.Queue[Optional[Tuple[tuple, Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-write-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: tuple) -> Future:
+        future: Future = Future()
+        self._pending.put((row, future))
+        return future
+
+    def close(self):
+        self._pending.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self._max_batch:
+                try:
+                    item = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: List[Tuple[tuple, Future]]):
+        try:
+            with self._transaction() as conn:
+                conn.executemany(SQL_INSERT, [row for row, _ in batch])
+        except sqlite3.IntegrityError:
+            # Uma linha inválida não deve derrubar o lote inteiro: grava uma a uma
+            for row, future in batch:
+                try:
+                    with self._transaction() as conn:
+                        conn.execute(SQL_INSERT, row)
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(None)
+            return
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        for _, future in batch:
+            future.set_result(None)
+
+
+# Armazenamento persistente em SQLite
+class SQLiteTaskStore(TaskStore):
+    """
+    Guarda as tarefas na tabela "tasks" de um arquivo SQLite em modo WAL,
+    o que permite que vários workers do uvicorn compartilhem o mesmo estado.
+    """
+
+    def __init__(self, path: str, pool_size: int = 8, max_batch: int = 500):
+        self.path = path
+        self._pool = ConnectionPool(path, max_size=pool_size)
+        self._create_schema()
+        self._batcher = WriteBatcher(self._write, max_batch=max_batch)
+
+    def _create_schema(self):
+        with self._pool.transaction() as conn:
+            columns = {row[1]: row[2].upper() for row in conn.execute("PRAGMA table_info(tasks)")}
+            if columns and columns.get("id") != "TEXT":
+                raise RuntimeError(
+                    f"A tabela 'tasks' de {self.path} usa IDs inteiros; "
+                    "use um arquivo novo para a API, que gera IDs UUID"
+                )
+            if columns and "version" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """
+        Transação de escrita que incrementa o contador de modificações
+        quando alguma linha de "tasks" foi alterada.
+        """
+        with self._pool.transaction() as conn:
+            changes = conn.total_changes
+            yield conn
+            if conn.total_changes != changes:
+                conn.execute(SQL_BUMP_VERSION)
+
+    def add(self, task: dict) -> dict:
+        row = _to_row(task)
+        try:
+            self._batcher.submit(row).result()
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Tarefa {task['id']} já existe")
+        return _from_row(row)
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._pool.connection() as conn:
+            row = conn.execute(SQL_GET, (task_id,)).fetchone()
+        return _from_row(row) if row else None
+
+    def add_many(self, tasks: List[dict]) -> List[dict]:
+        rows = [_to_row(task) for task in tasks]
+        try:
+            with self._write() as conn:
+                conn.executemany(SQL_INSERT, rows)
+        except sqlite3.IntegrityError:
+            raise ValueError("Lote contém IDs repetidos ou já existentes")
+        return [_from_row(row) for row in rows]
+
+    def update(self, task_id: str, fields: dict, expected_version: Optional[int] = None) -> Optional[dict]:
+        with self._write() as conn:
+            return self._update_in(conn, task_id, fields, expected_version)
+
+    def update_many(self, updates: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        with self._write() as conn:
+            return [self._update_in(conn, task_id, fields) for task_id, fields in updates]
+
+    def _update_in(self, conn: sqlite3.Connection, task_id: str, fields: dict,
+                   expected_version: Optional[int] = None) -> Optional[dict]:
+        fields = {f: v for f, v in fields.items() if f not in ("id", "data_criacao", "versao")}
+        updated = False
+        if fields:
+            assignments = ", ".join([f"{COLUMNS[f]} = ?" for f in fields] + ["version = version + 1"])
+            values = [to_db_datetime(v) if f == "data_atualizacao" else v for f, v in fields.items()]
+            sql, params = f"UPDATE tasks SET {assignments} WHERE id = ?", (*values, task_id)
+            if expected_version is not None:
+                sql, params = sql + " AND version = ?", (*params, expected_version)
+            updated = conn.execute(sql, params).rowcount > 0
+        row = conn.execute(SQL_GET, (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = _from_row(row)
+        if expected_version is not None and not updated and task["versao"] != expected_version:
+            raise VersionConflictError(task)
+        return task
+
+    def delete(self, task_id: str) -> bool:
+        with self._write() as conn:
+            return conn.execute(SQL_DELETE, (task_id,)).rowcount > 0
+
+    def delete_many(self, task_ids: List[str]) -> List[bool]:
+        with self._write() as conn:
+            return [conn.execute(SQL_DELETE, (task_id,)).rowcount > 0 for task_id in task_ids]
+
+    def page(self, limit: int, after: Optional[Tuple[datetime, str]] = None,
+             estado: Optional[str] = None, criado_de: Optional[datetime] = None,
+             criado_ate: Optional[datetime] = None, atualizado_de: Optional[datetime] = None,
+             atualizado_ate: Optional[datetime] = None, ordenar_por: str = "data_criacao",
+             desc: bool = False) -> List[dict]:
+        sort = SORT_EXPRESSIONS[ordenar_por]
+        modified = SORT_EXPRESSIONS["data_atualizacao"]
+        conditions, params = [], []
+        # Os intervalos de data são escritos sobre as mesmas expressões dos
+        # índices: em uma tarefa já atualizada, a data de modificação do
+        # índice é a própria updated_at
+        if atualizado_de is not None or atualizado_ate is not None:
+            conditions.append("updated_at IS NOT NULL")
+        for column, operator, value in (
+            ("status", "=", estado),
+            ("created_at", ">=", criado_de),
+            ("created_at", "<", criado_ate),
+            (modified, ">=", atualizado_de),
+            (modified, "<", atualizado_ate),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value if column == "status" else to_db_datetime(value))
+        if after is not None:
+            # Equivale a (sort, id) > (valor, id), mas com um termo de
+            # intervalo sobre sort que o SQLite consegue buscar no índice
+            operator = "<" if desc else ">"
+            conditions.append(f"{sort} {operator}= ? AND ({sort} {operator} ? OR id {operator} ?)")
+            value = to_db_datetime(after[0])
+            params.extend((value, value, after[1]))
+        direction = "DESC" if desc else "ASC"
+        sql = f"SELECT {_SELECT_COLUMNS} FROM tasks"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {sort} {direction}, id {direction} LIMIT ?"
+        with self._pool.connection() as conn:
+            rows = conn.execute(sql, (*params, limit)).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def __iter__(self) -> Iterator[dict]:
+        """
+        Percorre as linhas em ordem de criação usando o índice (created_at, id),
+        em blocos de ITER_CHUNK, sem manter uma conexão presa entre os blocos.
+        """
+        after = None
+        while True:
+            tasks = self.page(ITER_CHUNK, after=after)
+            yield from tasks
+            if len(tasks) < ITER_CHUNK:
+                return
+            after = (tasks[-1]["data_criacao"], tasks[-1]["id"])
+
+    def version(self) -> str:
+        with self._pool.connection() as conn:
+            return str(conn.execute(SQL_VERSION).fetchone()[0])
+
+    def __len__(self) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute(SQL_COUNT).fetchone()[0]
+
+    def close(self):
+        self._batcher.close()
+        self._pool.close()
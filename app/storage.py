@@ -0,0 +1,608 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+# Campos de uma tarefa, na ordem em que são armazenados
+TASK_FIELDS = ("id", "titulo", "descricao", "estado", "data_criacao", "data_atualizacao", "versao")
+
+# Campos pelos quais a listagem pode ser ordenada
+SORT_FIELDS = ("data_criacao", "data_atualizacao")
+
+# Entradas de um índice ordenado examinadas por passo de compactação (limita a pausa de cada escrita)
+COMPACT_STEP = 256
+
+# Entradas copiadas de cada vez por _SortedIndex.copy_keys
+COPY_CHUNK = 65_536
+
+
+# Erro de concorrência otimista: a tarefa mudou desde a versão informada
+class VersionConflictError(Exception):
+    def __init__(self, task: dict):
+        super().__init__(f"Tarefa {task['id']} está na versão {task['versao']}")
+        self.task = task  # Versão atual da tarefa
+
+
+# Interface comum a todos os mecanismos de armazenamento de tarefas
+class TaskStore(ABC):
+    """
+    Contrato usado pelos endpoints de /tasks/.
+    As tarefas entram e saem como dicionários com os campos de TASK_FIELDS.
+    O campo "versao" começa em 1 e é incrementado pelo armazenamento a cada atualização.
+    """
+
+    @abstractmethod
+    def add(self, task: dict) -> dict:
+        """
+        Armazena uma nova tarefa e a retorna.
+        """
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[dict]:
+        """
+        Retorna a tarefa com o ID informado, ou None se ela não existir.
+        """
+
+    @abstractmethod
+    def update(self, task_id: str, fields: dict, expected_version: Optional[int] = None) -> Optional[dict]:
+        """
+        Aplica os campos informados à tarefa e retorna a versão atualizada,
+        ou None se a tarefa não existir. Com expected_version, a atualização
+        só acontece se a tarefa ainda estiver nessa versão; caso contrário,
+        levanta VersionConflictError.
+        """
+
+    @abstractmethod
+    def delete(self, task_id: str) -> bool:
+        """
+        Remove a tarefa. Retorna False se ela não existir.
+        """
+
+    @abstractmethod
+    def add_many(self, tasks: List[dict]) -> List[dict]:
+        """
+        Armazena várias tarefas de uma vez: ou todas são gravadas, ou nenhuma.
+        """
+
+    @abstractmethod
+    def update_many(self, updates: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        """
+        Aplica uma lista de (task_id, campos) em um único passo atômico.
+        Retorna, para cada item, a tarefa atualizada ou None se ela não existir.
+        """
+
+    @abstractmethod
+    def delete_many(self, task_ids: List[str]) -> List[bool]:
+        """
+        Remove várias tarefas em um único passo atômico.
+        Retorna, para cada ID, se a tarefa existia.
+        """
+
+    @abstractmethod
+    def page(self, limit: int, after: Optional[Tuple[datetime, str]] = None,
+             estado: Optional[str] = None, criado_de: Optional[datetime] = None,
+             criado_ate: Optional[datetime] = None, atualizado_de: Optional[datetime] = None,
+             atualizado_ate: Optional[datetime] = None, ordenar_por: str = "data_criacao",
+             desc: bool = False) -> List[dict]:
+        """
+        Retorna até limit tarefas que passam nos filtros, ordenadas por
+        (sort_value(tarefa, ordenar_por), id). O cursor "after" é a chave
+        (valor, id) da última tarefa da página anterior. Os intervalos de
+        data são semiabertos: [de, ate).
+        """
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[dict]:
+        """
+        Itera sobre todas as tarefas em ordem de criação.
+        """
+
+    @abstractmethod
+    def version(self) -> str:
+        """
+        Identificador do estado do armazenamento como um todo: muda a cada
+        criação, atualização ou exclusão de tarefas.
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """
+        Quantidade de tarefas armazenadas.
+        """
+
+
+# Registro compacto de uma tarefa: __slots__ evita um dicionário por instância.
+# Registros publicados no armazenamento nunca são alterados: uma atualização
+# cria um novo registro (copy-on-write), então leitores sempre veem uma versão inteira.
+class _TaskRecord:
+    __slots__ = TASK_FIELDS
+
+    def __init__(self, id, titulo, descricao, estado, data_criacao, data_atualizacao=None, versao=None):
+        self.id = id
+        self.titulo = titulo
+        self.descricao = descricao
+        self.estado = estado
+        self.data_criacao = data_criacao
+        self.data_atualizacao = data_atualizacao
+        self.versao = versao or 1
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in TASK_FIELDS}
+
+    def replace(self, fields: dict) -> "_TaskRecord":
+        """
+        Nova versão do registro com os campos informados.
+        """
+        values = self.as_dict()
+        values.update((f, v) for f, v in fields.items() if f not in ("id", "data_criacao", "versao"))
+        values["versao"] = self.versao + 1
+        return _TaskRecord(**values)
+
+
+# Índice ordenado de chaves (valor, id) com exclusão preguiçosa
+class _SortedIndex:
+    """
+    As entradas que deixam de valer (tarefa excluída ou com valor alterado)
+    não são removidas na hora: são ignoradas na leitura e compactadas aos
+    poucos, um trecho de COMPACT_STEP entradas por escrita, a partir de "cursor".
+
+    A lista é alterada no lugar, sob o lock de escrita, e lida sem lock. Cada
+    alteração incrementa "seq" antes e depois (valor ímpar = alteração em
+    andamento), como um seqlock: o leitor só aceita uma posição lida se "seq"
+    era par e não mudou entre a busca binária e a leitura da chave.
+    """
+    __slots__ = ("keys", "stale", "seq", "cursor")
+
+    def __init__(self):
+        self.keys: List[Tuple[datetime, str]] = []
+        self.stale = 0  # Entradas mortas ainda presentes em keys
+        self.seq = 0
+        self.cursor = 0  # Onde o próximo passo de compactação começa
+
+    def insert(self, key: Tuple[datetime, str]):
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            # Entrada morta da mesma tarefa com o mesmo valor (por exemplo, o
+            # estado voltou ao anterior): ela volta a valer, sem duplicar a chave
+            self.stale -= 1
+            return
+        self.seq += 1
+        self.keys.insert(position, key)
+        self.seq += 1
+
+    def replace(self, start: int, end: int, keys: List[Tuple[datetime, str]]):
+        """
+        Troca o trecho keys[start:end] pelas chaves informadas, que devem
+        manter a lista ordenada.
+        """
+        self.seq += 1
+        self.keys[start:end] = keys
+        self.seq += 1
+
+    def copy_keys(self) -> List[Tuple[datetime, str]]:
+        """
+        Cópia da lista feita sem o lock de escrita, em trechos de COPY_CHUNK
+        chaves validados por "seq" como em iter_keys. Chaves presentes durante
+        toda a cópia sempre aparecem nela; as inseridas ou compactadas durante a
+        cópia podem aparecer ou não.
+        """
+        result: List[Tuple[datetime, str]] = []
+        last = None
+        while True:
+            seq = self.seq
+            keys = self.keys
+            start = bisect_right(keys, last) if last is not None else 0
+            chunk = keys[start:start + COPY_CHUNK]
+            if seq != self.seq or seq & 1:
+                time.sleep(0)
+                continue
+            if not chunk:
+                return result
+            result += chunk
+            last = chunk[-1]
+
+    def iter_keys(self, low: Optional[datetime] = None, high: Optional[datetime] = None,
+                  after: Optional[Tuple[datetime, str]] = None,
+                  desc: bool = False) -> Iterator[Tuple[datetime, str]]:
+        """
+        Chaves com valor em [low, high) posteriores ao cursor "after" no
+        sentido da ordenação. A posição é recalculada a partir da última
+        chave lida e validada pelo contador "seq", então alterações
+        concorrentes na lista nunca fazem uma chave ser pulada ou repetida.
+        """
+        keys = self.keys
+        last, first = after, True
+        while True:
+            seq = self.seq
+            try:
+                key = self._next_key(keys, last, first, low, high, desc)
+            except IndexError:  # A lista encolheu entre a busca e a leitura
+                key = None
+                seq = -1
+            if seq != self.seq or seq & 1:
+                time.sleep(0)  # Cede a vez ao escritor e tenta de novo
+                continue
+            if key is None:
+                return
+            yield key
+            last, first = key, False
+
+    @staticmethod
+    def _next_key(keys: List[Tuple[datetime, str]], last: Optional[Tuple[datetime, str]], first: bool,
+                  low: Optional[datetime], high: Optional[datetime], desc: bool) -> Optional[Tuple[datetime, str]]:
+        # Os limites do intervalo só precisam ser aplicados na primeira posição
+        if desc:
+            position = bisect_left(keys, last) if last is not None else len(keys)
+            if first and high is not None:
+                position = min(position, bisect_left(keys, (high,)))
+            position -= 1
+            if position < 0:
+                return None
+            key = keys[position]
+            return None if low is not None and key[0] < low else key
+        position = bisect_right(keys, last) if last is not None else 0
+        if first and low is not None:
+            position = max(position, bisect_left(keys, (low,)))
+        if position >= len(keys):
+            return None
+        key = keys[position]
+        return None if high is not None and key[0] >= high else key
+
+
+def sort_value(task, field: str) -> datetime:
+    """
+    Valor usado para ordenar uma tarefa pelo campo informado.
+    Em "data_atualizacao", tarefas nunca atualizadas usam a data de criação.
+    """
+    if field == "data_atualizacao":
+        return task["data_atualizacao"] or task["data_criacao"]
+    return task[field]
+
+
+# Armazenamento em memória com índices
+class MemoryTaskStore(TaskStore):
+    """
+    Mantém as tarefas em memória com:
+    - índice hash id -> registro (busca, atualização e exclusão em O(1));
+    - índices ordenados por data_criacao e por data de modificação, gerais e
+      por estado, usados em filtros, ordenação e paginação por cursor.
+
+    Leituras não usam lock: os registros são imutáveis e trocados por inteiro
+    no índice de IDs, e as alterações no lugar dos índices ordenados são
+    validadas pelos leitores (veja _SortedIndex). Escritas são serializadas
+    por um único lock.
+    """
+
+    def __init__(self):
+        self._write_lock = threading.Lock()
+        self._records: Dict[str, _TaskRecord] = {}
+        self._indexes: Dict[Tuple[str, Optional[str]], _SortedIndex] = {}
+        # Contador de modificações; o prefixo distingue instâncias (e reinícios do processo)
+        self._epoch = uuid4().hex[:8]
+        self._changes = 0
+
+    def _index_keys(self, record: _TaskRecord) -> Dict[Tuple[str, Optional[str]], Tuple[datetime, str]]:
+        keys = {}
+        for field in SORT_FIELDS:
+            key = (_record_sort_value(record, field), record.id)
+            keys[(field, None)] = key
+            keys[(field, record.estado)] = key
+        return keys
+
+    def _reindex(self, old: dict, new: dict):
+        """
+        Invalida as entradas antigas e insere as novas que mudaram.
+        """
+        for name, key in old.items():
+            if new.get(name) != key:
+                self._indexes[name].stale += 1
+        for name, key in new.items():
+            if old.get(name) != key:
+                self._indexes.setdefault(name, _SortedIndex()).insert(key)
+        for name in old:
+            index = self._indexes.get(name)
+            if index is not None and index.stale * 2 > len(index.keys):
+                self._compact_step(name)
+
+    def add(self, task: dict) -> dict:
+        record = _TaskRecord(**{field: task.get(field) for field in TASK_FIELDS})
+        with self._write_lock:
+            if record.id in self._records:
+                raise ValueError(f"Tarefa {record.id} já existe")
+            self._log_locked([("p", record)])
+            self._insert_locked(record)
+            self._changes += 1
+        return record.as_dict()
+
+    def _log_locked(self, changes: List[Tuple[str, object]]):
+        """
+        Chamado com o lock de escrita, uma vez por operação, com todas as
+        alterações que ela vai fazer ("p", registro novo) ou ("d", task_id),
+        antes de qualquer uma ser aplicada. Subclasses podem registrá-las ou
+        recusar a operação inteira levantando uma exceção.
+        """
+
+    def _insert_locked(self, record: _TaskRecord):
+        self._records[record.id] = record
+        self._reindex({}, self._index_keys(record))
+
+    def get(self, task_id: str) -> Optional[dict]:
+        record = self._records.get(task_id)
+        return record.as_dict() if record else None
+
+    def update(self, task_id: str, fields: dict, expected_version: Optional[int] = None) -> Optional[dict]:
+        with self._write_lock:
+            old = self._records.get(task_id)
+            if old is None:
+                return None
+            if expected_version is not None and old.versao != expected_version:
+                raise VersionConflictError(old.as_dict())
+            new = old.replace(fields)
+            self._log_locked([("p", new)])
+            self._replace_locked(old, new)
+        return new.as_dict()
+
+    def _replace_locked(self, old: _TaskRecord, new: _TaskRecord):
+        self._records[new.id] = new  # Publicação atômica da nova versão
+        self._reindex(self._index_keys(old), self._index_keys(new))
+        self._changes += 1
+
+    def delete(self, task_id: str) -> bool:
+        with self._write_lock:
+            if task_id not in self._records:
+                return False
+            self._log_locked([("d", task_id)])
+            return self._delete_locked(task_id)
+
+    def _delete_locked(self, task_id: str) -> bool:
+        record = self._records.pop(task_id, None)
+        if record is None:
+            return False
+        self._reindex(self._index_keys(record), {})
+        self._changes += 1
+        return True
+
+    # Nas operações em lote, o lote inteiro é validado e calculado antes de
+    # _log_locked, e só então aplicado: uma falha nunca deixa metade aplicada.
+
+    def add_many(self, tasks: List[dict]) -> List[dict]:
+        records = [_TaskRecord(**{field: task.get(field) for field in TASK_FIELDS}) for task in tasks]
+        with self._write_lock:
+            ids = {record.id for record in records}
+            if len(ids) != len(records) or not ids.isdisjoint(self._records):
+                raise ValueError("Lote contém IDs repetidos ou já existentes")
+            self._log_locked([("p", record) for record in records])
+            for record in records:
+                self._insert_locked(record)
+            self._changes += 1
+        return [record.as_dict() for record in records]
+
+    def update_many(self, updates: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        with self._write_lock:
+            # Um ID repetido no lote parte da versão calculada pelo item anterior
+            current: Dict[str, _TaskRecord] = {}
+            pairs: List[Optional[Tuple[_TaskRecord, _TaskRecord]]] = []
+            for task_id, fields in updates:
+                old = current.get(task_id) or self._records.get(task_id)
+                if old is None:
+                    pairs.append(None)
+                    continue
+                current[task_id] = new = old.replace(fields)
+                pairs.append((old, new))
+            changed = [pair for pair in pairs if pair is not None]
+            self._log_locked([("p", new) for _, new in changed])
+            for old, new in changed:
+                self._replace_locked(old, new)
+        return [pair[1].as_dict() if pair else None for pair in pairs]
+
+    def delete_many(self, task_ids: List[str]) -> List[bool]:
+        with self._write_lock:
+            removed = set()
+            found = []
+            for task_id in task_ids:
+                exists = task_id in self._records and task_id not in removed
+                if exists:
+                    removed.add(task_id)
+                found.append(exists)
+            deleted = [task_id for task_id, exists in zip(task_ids, found) if exists]
+            self._log_locked([("d", task_id) for task_id in deleted])
+            for task_id in deleted:
+                self._delete_locked(task_id)
+        return found
+
+    def _scan(self, field: str, estado: Optional[str] = None, low: Optional[datetime] = None,
+              high: Optional[datetime] = None, after: Optional[Tuple[datetime, str]] = None,
+              desc: bool = False) -> Iterator[_TaskRecord]:
+        """
+        Percorre um índice ordenado devolvendo apenas os registros vivos.
+        """
+        index = self._indexes.get((field, estado))
+        if index is None:
+            return
+        for value, task_id in index.iter_keys(low, high, after, desc):
+            record = self._records.get(task_id)
+            if (record is not None and _record_sort_value(record, field) == value
+                    and (estado is None or record.estado == estado)):
+                yield record
+
+    def page(self, limit: int, after: Optional[Tuple[datetime, str]] = None,
+             estado: Optional[str] = None, criado_de: Optional[datetime] = None,
+             criado_ate: Optional[datetime] = None, atualizado_de: Optional[datetime] = None,
+             atualizado_ate: Optional[datetime] = None, ordenar_por: str = "data_criacao",
+             desc: bool = False) -> List[dict]:
+        """
+        Os dois intervalos de data são atendidos por índices: o do campo de
+        ordenação limita a varredura do índice que já está na ordem pedida; se
+        o intervalo do outro campo for bem mais seletivo, a página sai desse
+        outro índice e é ordenada depois (veja _prefer_other_index).
+        """
+        if ordenar_por == "data_criacao":
+            low, high = criado_de, criado_ate
+            other, other_low, other_high = "data_atualizacao", atualizado_de, atualizado_ate
+        else:
+            low, high = atualizado_de, atualizado_ate
+            other, other_low, other_high = "data_criacao", criado_de, criado_ate
+        if (other_low is not None or other_high is not None) and self._prefer_other_index(
+                limit, (ordenar_por, estado), low, high, (other, estado), other_low, other_high):
+            candidates = [
+                (_record_sort_value(record, ordenar_por), record.id, record)
+                for record in self._scan(other, estado, other_low, other_high)
+                if _matches(record, criado_de, criado_ate, atualizado_de, atualizado_ate)
+            ]
+            if after is not None:
+                candidates = [c for c in candidates if ((c[0], c[1]) < after if desc else (c[0], c[1]) > after)]
+            candidates.sort(key=lambda c: (c[0], c[1]), reverse=desc)
+            return [record.as_dict() for _, _, record in candidates[:limit]]
+
+        result = []
+        for record in self._scan(ordenar_por, estado, low, high, after, desc):
+            if not _matches(record, criado_de, criado_ate, atualizado_de, atualizado_ate):
+                continue
+            result.append(record.as_dict())
+            if len(result) >= limit:
+                break
+        return result
+
+    def _range_size(self, name: Tuple[str, Optional[str]], low: Optional[datetime],
+                    high: Optional[datetime]) -> int:
+        """
+        Quantidade aproximada (inclui entradas mortas) de chaves do índice em [low, high).
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            return 0
+        keys = index.keys
+        start = bisect_left(keys, (low,)) if low is not None else 0
+        end = bisect_left(keys, (high,)) if high is not None else len(keys)
+        return max(0, end - start)
+
+    def _prefer_other_index(self, limit: int, sort_name: Tuple[str, Optional[str]], low: Optional[datetime],
+                            high: Optional[datetime], other_name: Tuple[str, Optional[str]],
+                            other_low: Optional[datetime], other_high: Optional[datetime]) -> bool:
+        """
+        Compara os custos estimados: varrer o índice de ordenação até achar
+        limit tarefas do outro intervalo (cerca de limit * n / m chaves, com n
+        chaves no intervalo de ordenação e m no outro) ou ler as m chaves do
+        outro índice e ordená-las.
+        """
+        other_size = self._range_size(other_name, other_low, other_high)
+        return other_size * other_size < limit * self._range_size(sort_name, low, high)
+
+    def __iter__(self) -> Iterator[dict]:
+        for record in list(self._records.values()):
+            yield record.as_dict()
+
+    def version(self) -> str:
+        return f"{self._epoch}-{self._changes}"
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _bulk_load(self, records: Dict[str, _TaskRecord],
+                   indexes: Optional[Dict[Tuple[str, Optional[str]], List[Tuple[datetime, str]]]] = None):
+        """
+        Substitui todo o conteúdo pelos registros informados, montando cada
+        índice ordenado com uma única ordenação em vez de uma inserção por
+        registro. Quem já tiver as chaves de cada índice em ordem pode passá-las
+        em "indexes". Usado na carga inicial, antes de o armazenamento ser exposto.
+        """
+        if indexes is None:
+            indexes = {}
+            for record in records.values():
+                for field in SORT_FIELDS:
+                    key = (_record_sort_value(record, field), record.id)
+                    indexes.setdefault((field, None), []).append(key)
+                    indexes.setdefault((field, record.estado), []).append(key)
+            for keys in indexes.values():
+                keys.sort()
+        with self._write_lock:
+            self._records = records
+            self._indexes = {}
+            for name, keys in indexes.items():
+                if keys:
+                    index = self._indexes[name] = _SortedIndex()
+                    index.keys = keys
+            self._changes += 1
+
+    def _compact_step(self, name: Tuple[str, Optional[str]]):
+        """
+        Remove as entradas mortas de um trecho de COMPACT_STEP entradas do
+        índice, a partir de onde o passo anterior parou. Chamado a cada escrita
+        enquanto mais da metade do índice estiver morta, então o trabalho feito com
+        o lock de escrita fica limitado e a memória ociosa, controlada.
+        """
+        field, estado = name
+        index = self._indexes[name]
+        live = self._records
+        start = index.cursor if index.cursor < len(index.keys) else 0
+        end = start + COMPACT_STEP
+        wrapped = end >= len(index.keys)  # Chegou ao fim: o próximo passo recomeça do início
+        chunk = index.keys[start:end]
+        kept = [
+            key for key in chunk
+            if key[1] in live and _record_sort_value(live[key[1]], field) == key[0]
+            and (estado is None or live[key[1]].estado == estado)
+        ]
+        if len(kept) != len(chunk):
+            index.replace(start, end, kept)
+            index.stale = max(0, index.stale - (len(chunk) - len(kept)))
+        index.cursor = 0 if wrapped else start + len(kept)
+        if not index.keys:
+            del self._indexes[name]
+
+
+def _record_sort_value(record: _TaskRecord, field: str) -> datetime:
+    if field == "data_atualizacao":
+        return record.data_atualizacao or record.data_criacao
+    return record.data_criacao
+
+
+def _matches(record: _TaskRecord, criado_de, criado_ate, atualizado_de, atualizado_ate) -> bool:
+    """
+    Aplica os filtros de intervalo de datas ([de, ate)) a um registro.
+    """
+    if criado_de is not None and record.data_criacao < criado_de:
+        return False
+    if criado_ate is not None and record.data_criacao >= criado_ate:
+        return False
+    if atualizado_de is not None or atualizado_ate is not None:
+        if record.data_atualizacao is None:
+            return False
+        if atualizado_de is not None and record.data_atualizacao < atualizado_de:
+            return False
+        if atualizado_ate is not None and record.data_atualizacao >= atualizado_ate:
+            return False
+    return True
+
+
+def store_from_env() -> TaskStore:
+    """
+    Escolhe o mecanismo de armazenamento pela variável TASKS_BACKEND:
+    "memory" (padrão) ou "sqlite", com o arquivo definido em TASKS_DB_PATH.
+    Em memória, TASKS_JOURNAL_DIR ativa a durabilidade por journal e snapshots.
+    """
+    backend = os.getenv("TASKS_BACKEND", "memory").lower()
+    if backend == "memory":
+        journal_dir = os.getenv("TASKS_JOURNAL_DIR")
+        if not journal_dir:
+            return MemoryTaskStore()
+        import atexit
+        from app.journal import JournaledTaskStore
+        store = JournaledTaskStore(
+            journal_dir,
+            wait_for_sync=os.getenv("TASKS_JOURNAL_SYNC", "group").lower() != "async",
+            snapshot_interval=float(os.getenv("TASKS_SNAPSHOT_INTERVAL", "300")),
+        )
+        atexit.register(store.close)
+        return store
+    if backend == "sqlite":
+        from app.sqlite_store import SQLiteTaskStore
+        return SQLiteTaskStore(
+            os.getenv("TASKS_DB_PATH", "tarefas_api.db"),
+            pool_size=int(os.getenv("TASKS_DB_POOL_SIZE", "8")),
+        )
+    raise ValueError(f"TASKS_BACKEND inválido: {backend}")
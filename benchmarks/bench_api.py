@@ -0,0 +1,301 @@
+"""
+Benchmark de carga e latência da API de tarefas.
+
+Roda em processo, contra app.main:app via httpx.ASGITransport (sem rede):
+popula o armazenamento com N tarefas, dispara uma mistura configurável de
+operações em cada nível de concorrência e mede req/s, latências p50/p95/p99
+por operação e o pico de memória (RSS) do processo.
+
+Uso:
+    python -m benchmarks.bench_api --sizes 1000,100000,1000000 --concurrency 1,16
+    python -m benchmarks.bench_api --save benchmarks/baseline.json
+    python -m benchmarks.bench_api --compare benchmarks/baseline.json --threshold 0.2
+
+Com --compare, o processo termina com código 1 se alguma operação crítica
+(--hot, por padrão get e list) ficar mais lenta que a linha de base além do limite.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+import httpx
+
+import app.main
+from app.storage import MemoryTaskStore, TaskStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Mistura padrão de operações (pesos relativos)
+DEFAULT_MIX = "get=50,list=20,create=10,update=15,delete=5"
+
+# Tarefas gravadas por chamada de add_many ao popular o armazenamento
+SEED_CHUNK = 50_000
+
+ESTADOS = ("pendente", "em andamento", "concluída")
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """
+    Converte "get=50,list=20" em {"get": 50, "list": 20}.
+    """
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise ValueError(f"Operação desconhecida: {name}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Pico de memória residente do processo, em MB.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes no macOS, KB no Linux
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def make_store(backend: str, directory: str) -> TaskStore:
+    if backend == "memory":
+        return MemoryTaskStore()
+    from app.sqlite_store import SQLiteTaskStore
+    return SQLiteTaskStore(os.path.join(directory, f"bench-{uuid4().hex}.db"))
+
+
+def seed_store(store: TaskStore, size: int) -> List[str]:
+    """
+    Popula o armazenamento direto pela interface de lote, sem passar pelo HTTP.
+    """
+    ids = []
+    start = datetime.now(timezone.utc) - timedelta(seconds=size)
+    for offset in range(0, size, SEED_CHUNK):
+        batch = [
+            {
+                "id": str(uuid4()),
+                "titulo": f"Tarefa {i}",
+                "descricao": None,
+                "estado": ESTADOS[i % len(ESTADOS)],
+                "data_criacao": start + timedelta(seconds=i),
+                "data_atualizacao": None,
+            }
+            for i in range(offset, min(size, offset + SEED_CHUNK))
+        ]
+        store.add_many(batch)
+        ids.extend(task["id"] for task in batch)
+    return ids
+
+
+# Cada operação recebe o cliente, a lista de IDs existentes e o gerador aleatório
+async def op_create(client: httpx.AsyncClient, ids: List[str], rng: random.Random):
+    response = await client.post("/tasks/", json={"titulo": "Bench", "estado": rng.choice(ESTADOS)})
+    ids.append(response.json()["id"])
+    return response
+
+
+async def op_list(client: httpx.AsyncClient, ids: List[str], rng: random.Random):
+    params = {"limit": 100}
+    if rng.random() < 0.5:
+        params["estado"] = rng.choice(ESTADOS)
+    return await client.get("/tasks/", params=params)
+
+
+async def op_get(client: httpx.AsyncClient, ids: List[str], rng: random.Random):
+    return await client.get(f"/tasks/{rng.choice(ids)}")
+
+
+async def op_update(client: httpx.AsyncClient, ids: List[str], rng: random.Random):
+    return await client.put(f"/tasks/{rng.choice(ids)}", json={"titulo": "Atualizada", "estado": rng.choice(ESTADOS)})
+
+
+async def op_delete(client: httpx.AsyncClient, ids: List[str], rng: random.Random):
+    # Troca com o último e remove, para não pagar O(n) na lista de IDs
+    index = rng.randrange(len(ids))
+    ids[index], ids[-1] = ids[-1], ids[index]
+    return await client.delete(f"/tasks/{ids.pop()}")
+
+
+OPERATIONS = {
+    "create": op_create,
+    "list": op_list,
+    "get": op_get,
+    "update": op_update,
+    "delete": op_delete,
+}
+
+
+async def run_scenario(ids: List[str], mix: Dict[str, int], concurrency: int,
+                       requests: int, seed: int = 0) -> dict:
+    """
+    Executa "requests" operações sorteadas segundo "mix", com "concurrency"
+    clientes simultâneos, e retorna as métricas do cenário.
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    plan = rng.choices(names, weights=[mix[name] for name in names], k=requests)
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors = 0
+    position = 0
+
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal position, errors
+            while position < len(plan):
+                name = plan[position]
+                position += 1
+                if name in ("get", "update", "delete") and not ids:
+                    name = "create"
+                started = time.perf_counter()
+                response = await OPERATIONS[name](client, ids, rng)
+                latencies.setdefault(name, []).append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ops = {}
+    for name, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        ops[name] = {
+            "count": len(values),
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "req_per_s": requests / elapsed,
+        "ops": ops,
+    }
+
+
+def run_benchmark(backend: str, sizes: List[int], concurrency_levels: List[int],
+                  mix: Dict[str, int], requests: int) -> dict:
+    """
+    Roda todos os cenários (tamanho x concorrência) e retorna o relatório completo.
+    """
+    results = {}
+    original_store = app.main.tasks_db
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            for size in sizes:
+                store = make_store(backend, directory)
+                app.main.tasks_db = store
+                app.main.json_cache.clear()
+                seed_started = time.perf_counter()
+                ids = seed_store(store, size)
+                seed_seconds = time.perf_counter() - seed_started
+                for concurrency in concurrency_levels:
+                    scenario = asyncio.run(run_scenario(ids, mix, concurrency, requests))
+                    scenario["size"] = size
+                    scenario["seed_s"] = seed_seconds
+                    scenario["peak_rss_mb"] = peak_rss_mb()
+                    results[f"{backend}/{size}/c{concurrency}"] = scenario
+                if hasattr(store, "close"):
+                    store.close()
+        finally:
+            app.main.tasks_db = original_store
+    return {
+        "meta": {
+            "backend": backend,
+            "mix": mix,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float, hot_ops: List[str]) -> List[str]:
+    """
+    Lista as regressões do relatório atual em relação à linha de base:
+    p95 de uma operação crítica acima de (1 + threshold) vezes o da base, ou
+    vazão do cenário abaixo de (1 - threshold) vezes a da base.
+    """
+    regressions = []
+    for key, scenario in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        if scenario["req_per_s"] < base["req_per_s"] * (1 - threshold):
+            regressions.append(f"{key}: {scenario['req_per_s']:.0f} req/s (base {base['req_per_s']:.0f})")
+        for name in hot_ops:
+            now, before = scenario["ops"].get(name), base["ops"].get(name)
+            if now and before and now["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append(f"{key} {name}: p95 {now['p95_ms']:.2f} ms (base {before['p95_ms']:.2f} ms)")
+    return regressions
+
+
+def print_report(report: dict):
+    for key, scenario in report["results"].items():
+        rss = scenario["peak_rss_mb"]
+        line = f"{key}: {scenario['req_per_s']:,.0f} req/s, erros={scenario['errors']}"
+        print(line + (f", pico RSS={rss:.0f} MB" if rss is not None else ""))
+        for name, op in sorted(scenario["ops"].items()):
+            print(f"    {name:<7} n={op['count']:<6} p50={op['p50_ms']:7.2f} ms  "
+                  f"p95={op['p95_ms']:7.2f} ms  p99={op['p99_ms']:7.2f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de carga da API de tarefas")
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Tamanhos do armazenamento, separados por vírgula")
+    parser.add_argument("--concurrency", default="1,16", help="Níveis de concorrência, separados por vírgula")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Pesos das operações, ex.: get=50,list=20")
+    parser.add_argument("--requests", type=int, default=2000, help="Requisições por cenário")
+    parser.add_argument("--save", help="Grava o relatório em JSON como nova linha de base")
+    parser.add_argument("--compare", help="Linha de base em JSON para detectar regressões")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora tolerada (0.2 = 20%%)")
+    parser.add_argument("--hot", default="get,list", help="Operações críticas comparadas por p95")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        args.backend,
+        [int(size) for size in args.sizes.split(",")],
+        [int(level) for level in args.concurrency.split(",")],
+        parse_mix(args.mix),
+        args.requests,
+    )
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, report, args.threshold, args.hot.split(","))
+        for regression in regressions:
+            print(f"REGRESSÃO: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Micro-benchmark da validação de tokens: verify_token com e sem cache.
+
+Uso: python -m benchmarks.bench_auth [iterações]
+"""
+import sys
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app import auth
+
+
+def run(iterations: int, cache: auth.TokenCache) -> float:
+    """
+    Valida o mesmo token "iterations" vezes e retorna as validações por segundo.
+    """
+    auth.token_cache = cache
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=auth.create_token({"sub": "bench"}))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        auth.verify_token(credentials)
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    original = auth.token_cache
+    try:
+        uncached = run(iterations, auth.TokenCache(maxsize=0))
+        cache = auth.TokenCache()
+        cached = run(iterations, cache)
+    finally:
+        auth.token_cache = original
+    print(f"sem cache: {uncached:12,.0f} validações/s")
+    print(f"com cache: {cached:12,.0f} validações/s  ({cached / uncached:.1f}x, {cache.stats()})")
+
+
+if __name__ == "__main__":
+    main()
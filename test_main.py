@@ -1,3 +1,5 @@
+import pytest
+from uuid import uuid4
 from fastapi.testclient import TestClient
 from app.main import app
 # Cria um cliente de teste para a aplicação
@@ -52,3 +54,646 @@ def test_delete_task():
     response = client.delete(f"/tasks/{task_id}")
     assert response.status_code == 200
     assert response.json() == {"message": "Tarefa deletada com sucesso!"}
+
+# Teste dos índices do armazenamento em memória
+def test_memory_store_indexes():
+    """
+    Testa os índices por ID, estado e data de criação do armazenamento em memória.
+    """
+    from datetime import datetime, timedelta, timezone
+    from app.storage import MemoryTaskStore
+
+    store = MemoryTaskStore()
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(10):
+        store.add({"id": str(i), "titulo": f"T{i}", "descricao": None,
+                   "estado": "pendente" if i % 2 else "concluída",
+                   "data_criacao": base + timedelta(days=i)})
+    assert store.get("3")["titulo"] == "T3"
+    assert store.delete("3") is True
+    assert store.delete("3") is False
+    assert store.get("3") is None
+    assert len(store) == 9
+
+    store.update("5", {"estado": "concluída"})
+    assert [t["id"] for t in store.page(10, estado="pendente")] == ["1", "7", "9"]
+
+    criadas = store.page(10, criado_de=base + timedelta(days=2), criado_ate=base + timedelta(days=6))
+    assert [t["id"] for t in criadas] == ["2", "4", "5"]
+
+    # Estado que volta ao anterior: a entrada morta revive, sem chave duplicada
+    alternada = MemoryTaskStore()
+    for i in range(10):
+        alternada.add({"id": str(i), "titulo": f"T{i}", "descricao": None,
+                       "estado": "pendente", "data_criacao": base + timedelta(days=i)})
+    alternada.update("4", {"estado": "concluída"})
+    alternada.update("4", {"estado": "pendente"})
+    index = alternada._indexes[("data_criacao", "pendente")]
+    assert len(index.keys) == len(set(index.keys)) == 10 and index.stale == 0
+    assert [t["id"] for t in alternada.page(20, estado="pendente")] == [str(i) for i in range(10)]
+
+    # Atualizações repetidas: o índice é compactado aos poucos e continua correto
+    for i in range(5000):
+        store.update(str(i % 9 if i % 9 != 3 else 9), {"data_atualizacao": base + timedelta(days=20, seconds=i)})
+    index = store._indexes[("data_atualizacao", None)]
+    assert len(index.keys) <= 2 * len(store) + 1
+    pagina = store.page(100, ordenar_por="data_atualizacao")
+    assert sorted(t["id"] for t in pagina) == sorted(t["id"] for t in store)
+
+    # Filtro seletivo por atualização com ordenação por criação: atendido pelo outro índice
+    store.update("4", {"data_atualizacao": base + timedelta(days=40)})
+    store.update("7", {"data_atualizacao": base + timedelta(days=41)})
+    filtro = {"atualizado_de": base + timedelta(days=40), "atualizado_ate": base + timedelta(days=42)}
+    assert store._prefer_other_index(1, ("data_criacao", None), None, None,
+                                     ("data_atualizacao", None), filtro["atualizado_de"], filtro["atualizado_ate"])
+    primeira = store.page(1, **filtro)
+    segunda = store.page(1, after=(primeira[0]["data_criacao"], primeira[0]["id"]), **filtro)
+    assert [t["id"] for t in primeira + segunda] == ["4", "7"]
+    assert [t["id"] for t in store.page(5, desc=True, **filtro)] == ["7", "4"]
+
+# Teste da leitura de um índice ordenado alterado no meio da busca
+def test_sorted_index_concurrent_insert():
+    """
+    Testa que uma inserção abaixo do cursor, feita entre a busca binária e a
+    leitura da chave, não faz o leitor repetir nem pular chaves.
+    """
+    from datetime import datetime, timedelta, timezone
+    from app.storage import _SortedIndex
+
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    chave = lambda dia, task_id: (base + timedelta(days=dia), task_id)
+
+    for desc, chaves, cursor, esperado in (
+        (False, [chave(1, "a"), chave(3, "c")], chave(1, "a"), [chave(3, "c")]),
+        (True, [chave(1, "a"), chave(3, "c")], chave(3, "c"), [chave(1, "a"), chave(0, "z")]),
+    ):
+        index = _SortedIndex()
+        leituras = []
+
+        # Lista que simula um escritor inserindo (0, "z") logo antes da terceira leitura
+        class Lista(list):
+            def __getitem__(self, position):
+                leituras.append(position)
+                if len(leituras) == 3:
+                    index.insert(chave(0, "z"))
+                return super().__getitem__(position)
+
+        index.keys = Lista(chaves)
+        assert list(index.iter_keys(after=cursor, desc=desc)) == esperado
+
+# Teste do armazenamento persistente em SQLite
+def test_sqlite_store(tmp_path):
+    """
+    Testa o CRUD, as inserções concorrentes em lote e a persistência do armazenamento SQLite.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime, timezone
+    from app.sqlite_store import SQLiteTaskStore
+
+    path = str(tmp_path / "tarefas.db")
+    store = SQLiteTaskStore(path, pool_size=4)
+
+    def criar(i):
+        return store.add({"id": f"id-{i:03d}", "titulo": f"T{i}", "descricao": None,
+                          "estado": "pendente" if i % 2 else "concluída",
+                          "data_criacao": datetime.now(timezone.utc)})
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(criar, range(200)))
+    assert len(store) == 200
+
+    task = store.update("id-001", {"titulo": "Atualizado", "data_atualizacao": datetime.now(timezone.utc)})
+    assert task["titulo"] == "Atualizado"
+    assert task["data_atualizacao"] is not None
+    assert store.update("inexistente", {"titulo": "X"}) is None
+    assert store.delete("id-002") is True
+    assert store.delete("id-002") is False
+    assert len(store.page(1000, estado="pendente")) == 100
+    store.close()
+
+    reaberto = SQLiteTaskStore(path)
+    assert reaberto.get("id-001")["titulo"] == "Atualizado"
+    assert len(list(reaberto)) == 199
+    reaberto.close()
+
+# Armazenamento vazio, em memória e em SQLite, usado pela aplicação durante o teste
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    import app.main
+    from app.sqlite_store import SQLiteTaskStore
+    from app.storage import MemoryTaskStore
+
+    if request.param == "memory":
+        store = MemoryTaskStore()
+    else:
+        store = SQLiteTaskStore(str(tmp_path / "tarefas.db"))
+    monkeypatch.setattr(app.main, "tasks_db", store)
+    yield store
+    if request.param == "sqlite":
+        store.close()
+
+# Teste da listagem paginada por cursor, com filtros e streaming
+def test_list_tasks_pagination(store):
+    """
+    Testa a paginação por cursor, os filtros, a ordenação e o modo NDJSON da listagem.
+    """
+    import json
+
+    ids = []
+    for i in range(25):
+        estado = "pendente" if i % 2 else "concluída"
+        ids.append(client.post("/tasks/", json={"titulo": f"T{i}", "estado": estado}).json()["id"])
+
+    recebidos, after = [], None
+    while True:
+        params = {"limit": 10, **({"after": after} if after else {})}
+        response = client.get("/tasks/", params=params)
+        assert response.status_code == 200
+        recebidos += [t["id"] for t in response.json()]
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            break
+    assert recebidos == ids
+
+    response = client.get("/tasks/", params={"estado": "pendente", "ordem": "desc", "limit": 3})
+    assert [t["id"] for t in response.json()] == [ids[23], ids[21], ids[19]]
+
+    client.put(f"/tasks/{ids[0]}", json={"titulo": "Atualizado", "estado": "pendente"})
+    response = client.get("/tasks/", params={"ordenar_por": "data_atualizacao", "ordem": "desc", "limit": 1})
+    assert response.json()[0]["id"] == ids[0]
+    atualizado = response.json()[0]["data_atualizacao"]
+    response = client.get("/tasks/", params={"atualizado_de": atualizado})
+    assert [t["id"] for t in response.json()] == [ids[0]]
+
+    response = client.get("/tasks/", params={"formato": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == ids
+
+    assert client.get("/tasks/", params={"after": "invalido"}).status_code == 400
+
+# Teste dos endpoints em lote
+def test_bulk_endpoints(store):
+    """
+    Testa a criação, a atualização e a exclusão de tarefas em lote.
+    """
+    response = client.post("/tasks/bulk", json=[{"titulo": f"T{i}", "estado": "pendente"} for i in range(50)])
+    assert response.status_code == 200
+    ids = [item["id"] for item in response.json()]
+    assert len(set(ids)) == 50 and len(store) == 50
+    assert all(item["status"] == 201 for item in response.json())
+
+    response = client.patch("/tasks/bulk", json=[{"id": ids[0], "estado": "concluída"}, {"id": "inexistente", "titulo": "X"}])
+    assert [item["status"] for item in response.json()] == [200, 404]
+    task = client.get(f"/tasks/{ids[0]}").json()
+    assert task["estado"] == "concluída" and task["titulo"] == "T0"
+    assert task["data_atualizacao"] is not None
+
+    response = client.request("DELETE", "/tasks/bulk", json=ids[:10] + ["inexistente"])
+    assert [item["status"] for item in response.json()] == [200] * 10 + [404]
+    assert len(store) == 40
+
+    assert client.post("/tasks/bulk", json=[]).status_code == 422
+    assert client.post("/tasks/bulk", json=[{"titulo": "Sem estado"}]).status_code == 422
+    assert len(store) == 40
+
+# Teste do cache de tokens JWT
+def test_token_cache(monkeypatch):
+    """
+    Testa os acertos do cache de tokens, a revogação (também de tokens sem "exp")
+    e a rejeição de tokens inválidos.
+    """
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+    import time
+    import jwt
+    from app import auth
+
+    cache = auth.TokenCache(maxsize=2)
+    monkeypatch.setattr(auth, "token_cache", cache)
+    token = auth.create_token({"sub": "usuario"})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    assert auth.verify_token(credentials)["sub"] == "usuario"
+    assert auth.verify_token(credentials)["sub"] == "usuario"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    auth.revoke_token(token)
+    with pytest.raises(HTTPException) as error:
+        auth.verify_token(credentials)
+    assert error.value.detail == "Token revogado"
+
+    for invalid in ("nao-e-um-jwt", token[:-2] + "xx"):
+        with pytest.raises(HTTPException):
+            auth.verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=invalid))
+    assert cache.stats()["size"] == 0
+
+    # Sem "exp", a revogação não pode caducar sozinha
+    sem_exp = jwt.encode({"sub": "usuario"}, auth.SECRET_KEY, algorithm="HS256")
+    credenciais_sem_exp = HTTPAuthorizationCredentials(scheme="Bearer", credentials=sem_exp)
+    auth.revoke_token(sem_exp)
+    agora = time.time()
+    monkeypatch.setattr(auth.time, "time", lambda: agora + auth.TOKEN_CACHE_TTL + 1)
+    with pytest.raises(HTTPException) as error:
+        auth.verify_token(credenciais_sem_exp)
+    assert error.value.detail == "Token revogado"
+
+# Teste das requisições condicionais (ETag / If-None-Match)
+def test_conditional_requests(store):
+    """
+    Testa as respostas 304 da tarefa e da coleção e a troca de ETag após escritas.
+    """
+    task_id = client.post("/tasks/", json={"titulo": "Teste", "estado": "pendente"}).json()["id"]
+
+    response = client.get(f"/tasks/{task_id}")
+    etag = response.headers["ETag"]
+    assert response.json()["titulo"] == "Teste"
+    response = client.get(f"/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.content == b""
+
+    lista = client.get("/tasks/")
+    lista_etag = lista.headers["ETag"]
+    assert client.get("/tasks/", headers={"If-None-Match": lista_etag}).status_code == 304
+
+    client.put(f"/tasks/{task_id}", json={"titulo": "Atualizado", "estado": "concluída"})
+    response = client.get(f"/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["titulo"] == "Atualizado"
+    assert response.headers["ETag"] != etag
+    assert client.get("/tasks/", headers={"If-None-Match": lista_etag}).status_code == 200
+
+    lista_etag = client.get("/tasks/").headers["ETag"]
+    client.delete(f"/tasks/{task_id}")
+    assert client.get("/tasks/", headers={"If-None-Match": lista_etag}).status_code == 200
+    assert client.get(f"/tasks/{task_id}").status_code == 404
+
+# Teste da concorrência otimista (If-Match) no PUT
+def test_update_if_match(store):
+    """
+    Testa que um PUT com ETag desatualizada em If-Match é rejeitado com 412.
+    """
+    response = client.post("/tasks/", json={"titulo": "Teste", "estado": "pendente"})
+    task_id, etag = response.json()["id"], response.headers["ETag"]
+
+    response = client.put(f"/tasks/{task_id}", json={"titulo": "V2", "estado": "pendente"}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    novo_etag = response.headers["ETag"]
+
+    response = client.put(f"/tasks/{task_id}", json={"titulo": "V3", "estado": "pendente"}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert response.headers["ETag"] == novo_etag
+    assert client.get(f"/tasks/{task_id}").json()["titulo"] == "V2"
+    assert client.put(f"/tasks/{task_id}", json={"titulo": "V3", "estado": "pendente"},
+                      headers={"If-Match": "lixo"}).status_code == 412
+
+# Teste de estresse com várias threads fazendo CRUD ao mesmo tempo
+def test_concurrent_crud_stress(store):
+    """
+    Testa que nenhuma atualização se perde com várias threads atualizando a mesma
+    tarefa (ler, modificar e gravar com versão esperada) enquanto outras criam,
+    excluem e listam tarefas.
+    """
+    import threading
+    from datetime import datetime, timezone
+    from app.storage import VersionConflictError
+
+    def nova_tarefa(titulo):
+        return store.add({"id": str(uuid4()), "titulo": titulo, "descricao": None, "estado": "pendente",
+                          "data_criacao": datetime.now(timezone.utc)})
+
+    contador = nova_tarefa("0")
+    threads_por_tipo, incrementos = 6, 40
+    erros = []
+
+    def incrementar():
+        for _ in range(incrementos):
+            while True:
+                atual = store.get(contador["id"])
+                try:
+                    store.update(contador["id"], {"titulo": str(int(atual["titulo"]) + 1)},
+                                 expected_version=atual["versao"])
+                    break
+                except VersionConflictError:
+                    continue
+
+    def criar_e_excluir():
+        for i in range(incrementos):
+            task = nova_tarefa(f"temp-{i}")
+            store.update(task["id"], {"estado": "concluída", "data_atualizacao": datetime.now(timezone.utc)})
+            assert store.delete(task["id"])
+
+    def listar():
+        for _ in range(incrementos):
+            pagina = store.page(1000, ordenar_por="data_atualizacao")
+            chaves = [(t["data_atualizacao"] or t["data_criacao"], t["id"]) for t in pagina]
+            assert chaves == sorted(set(chaves))  # Ordenada e sem repetições
+            assert store.get(contador["id"]) is not None
+
+    def executar(alvo):
+        try:
+            alvo()
+        except BaseException as exc:
+            erros.append(exc)
+
+    threads = [threading.Thread(target=executar, args=(alvo,))
+               for alvo in (incrementar, criar_e_excluir, listar) for _ in range(threads_por_tipo)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not erros
+    final = store.get(contador["id"])
+    assert final["titulo"] == str(threads_por_tipo * incrementos)
+    assert final["versao"] == threads_por_tipo * incrementos + 1
+    assert len(store) == 1
+
+# Teste de leituras sem bloqueio no armazenamento em memória
+def test_memory_reads_do_not_block_writers():
+    """
+    Testa que leituras e listagens terminam mesmo com o lock de escrita ocupado.
+    """
+    import threading
+    from datetime import datetime, timezone
+    from app.storage import MemoryTaskStore
+
+    store = MemoryTaskStore()
+    task = store.add({"id": "1", "titulo": "T", "estado": "pendente", "data_criacao": datetime.now(timezone.utc)})
+    resultados = []
+    with store._write_lock:
+        leitor = threading.Thread(target=lambda: resultados.append((store.get("1"), store.page(10))))
+        leitor.start()
+        leitor.join(timeout=5)
+        assert not leitor.is_alive()
+    assert resultados == [(task, [task])]
+
+# Teste do benchmark de carga (execução mínima)
+def test_benchmark_smoke():
+    """
+    Testa uma execução pequena do benchmark e a detecção de regressões contra a linha de base.
+    """
+    import copy
+    import app.main
+    from benchmarks.bench_api import compare, parse_mix, run_benchmark
+
+    original = app.main.tasks_db
+    report = run_benchmark("memory", [200], [1, 4], parse_mix("get=5,list=2,create=1,update=1,delete=1"), 100)
+    assert app.main.tasks_db is original
+    cenario = report["results"]["memory/200/c4"]
+    assert cenario["errors"] == 0 and cenario["req_per_s"] > 0
+    assert {"get", "list"} <= set(cenario["ops"])
+
+    assert compare(report, report, 0.2, ["get", "list"]) == []
+    pior = copy.deepcopy(report)
+    pior["results"]["memory/200/c4"]["ops"]["get"]["p95_ms"] *= 2
+    assert len(compare(report, pior, 0.2, ["get", "list"])) == 1
+
+# Teste do endpoint de métricas e do perfilador por requisição
+def test_metrics_and_profiling(tmp_path):
+    """
+    Testa as métricas por rota e por fase em /metrics e o perfil gerado com X-Profile,
+    que contém só a requisição perfilada.
+    """
+    import threading
+    from fastapi import FastAPI
+    from app.metrics import MetricsMiddleware, ProfiledRoute
+
+    task_id = client.post("/tasks/", json={"titulo": "Teste", "estado": "pendente"}).json()["id"]
+    client.get(f"/tasks/{task_id}")
+    client.get("/nao-existe")
+    texto = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/tasks/{task_id}",status="200"}' in texto
+    assert 'route="unmatched",status="404"' in texto
+    assert 'task_phase_duration_seconds_count{phase="store_lookup"}' in texto
+    assert 'task_phase_duration_seconds_count{phase="serialization"}' in texto
+    assert "http_requests_in_flight" in texto
+    assert 'http_response_size_bytes_bucket{method="GET",route="/tasks/{task_id}",le="+Inf"}' in texto
+
+    def lenta():
+        total = 0
+        for i in range(300_000):
+            total += i
+        return {"total": total}
+
+    def outra():
+        # Requisição concorrente, que não deve aparecer no perfil da outra
+        while not terminou.is_set():
+            sum(range(1000))
+        return {}
+
+    terminou = threading.Event()
+    perfilada = FastAPI()
+    perfilada.router.route_class = ProfiledRoute
+    perfilada.get("/lenta")(lenta)
+    perfilada.get("/outra")(outra)
+    perfilada.add_middleware(MetricsMiddleware, profiling=True, profile_dir=str(tmp_path))
+    perfilado = TestClient(perfilada)
+    concorrente = threading.Thread(target=lambda: perfilado.get("/outra", headers={"X-Profile": "0"}))
+    concorrente.start()
+    response = perfilado.get("/lenta", headers={"X-Profile": "1"})
+    terminou.set()
+    concorrente.join()
+    with open(response.headers["X-Profile-File"], encoding="utf-8") as arquivo:
+        linhas = arquivo.read().splitlines()
+    assert linhas and all(linha.rsplit(" ", 1)[1].isdigit() for linha in linhas)
+    assert any("lenta (test_main.py" in linha for linha in linhas)
+    assert not any("outra (test_main.py" in linha for linha in linhas)
+
+# Teste da durabilidade do armazenamento em memória (journal + snapshot)
+@pytest.mark.parametrize("wait_for_sync", [True, False])
+def test_journaled_store_recovery(tmp_path, wait_for_sync):
+    """
+    Testa que criações, atualizações e exclusões sobrevivem a um reinício,
+    antes e depois de um snapshot, inclusive com uma linha final incompleta no journal,
+    e que os índices carregados do snapshot são iguais aos montados do zero.
+    """
+    import glob
+    from datetime import datetime, timezone
+    from app.journal import JournaledTaskStore
+    from app.storage import MemoryTaskStore
+
+    def nova(i):
+        return {"id": f"id-{i:03d}", "titulo": f"T{i}", "descricao": None,
+                "estado": "pendente", "data_criacao": datetime.now(timezone.utc)}
+
+    def conferir_indices(store):
+        referencia = MemoryTaskStore()
+        referencia._bulk_load(dict(store._records))
+        assert {nome: index.keys for nome, index in store._indexes.items()} == \
+            {nome: index.keys for nome, index in referencia._indexes.items()}
+
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=wait_for_sync)
+    store.add_many([nova(i) for i in range(10)])
+    store.update("id-001", {"titulo": "Atualizada", "estado": "concluída"})
+    store.delete("id-002")
+    store.close()
+
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=wait_for_sync)
+    assert len(store) == 9 and store.get("id-002") is None
+    assert store.get("id-001")["titulo"] == "Atualizada"
+    assert store.get("id-001")["versao"] == 2
+    assert [t["id"] for t in store.page(10, estado="concluída")] == ["id-001"]
+
+    store.snapshot()
+    assert len(glob.glob(str(tmp_path / "snapshot-*.cols"))) == 1
+    store.close()
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=wait_for_sync)
+    conferir_indices(store)
+    store.add(nova(10))
+    store.delete("id-003")
+    store.update("id-005", {"estado": "em andamento", "data_atualizacao": datetime.now(timezone.utc)})
+    store.close()
+    segmentos = sorted(glob.glob(str(tmp_path / "journal-*.ndjson")))
+    with open(segmentos[-1], "ab") as arquivo:
+        arquivo.write(b'[999,"d","id-0')  # Escrita interrompida por uma queda
+
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=wait_for_sync)
+    assert len(store) == 9
+    assert store.get("id-010") is not None and store.get("id-003") is None
+    assert store.get("id-004") is not None
+    assert store.page(3)[0]["id"] == "id-000"
+    assert [t["id"] for t in store.page(10, estado="em andamento")] == ["id-005"]
+    conferir_indices(store)
+    store.delete("id-004")
+    store.close()
+
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=wait_for_sync)
+    assert len(store) == 8 and store.get("id-004") is None
+    store.close()
+
+
+# Teste do armazenamento em memória quando o journal não consegue gravar
+def test_journaled_store_write_failure(tmp_path, monkeypatch, caplog):
+    """
+    Testa que, depois de uma falha de fsync no journal, novas escritas são
+    recusadas sem alterar a memória e a thread de snapshots continua viva.
+    """
+    import os
+    import time
+    from datetime import datetime, timezone
+    from app.journal import JournaledTaskStore
+
+    def falhar(fd):
+        raise OSError("disco cheio")
+
+    def nova(i):
+        return {"id": f"id-{i}", "titulo": f"T{i}", "descricao": None,
+                "estado": "pendente", "data_criacao": datetime.now(timezone.utc)}
+
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=False, snapshot_interval=0.05)
+    store.add(nova(0))
+    monkeypatch.setattr(os, "fsync", falhar)
+    store.add(nova(1))
+    store._journal._thread.join(timeout=5)
+    assert not store._journal._thread.is_alive()
+
+    versao = store.version()
+    for escrita in (lambda: store.add(nova(2)), lambda: store.update("id-0", {"titulo": "X"}),
+                    lambda: store.delete("id-0"), lambda: store.add_many([nova(3), nova(4)])):
+        with pytest.raises(RuntimeError):
+            escrita()
+    assert store.version() == versao and len(store) == 2
+    assert store.get("id-0")["titulo"] == "T0"
+    assert store._journal._pending == []
+
+    prazo = time.monotonic() + 5
+    while "Falha ao gravar o snapshot" not in caplog.text and time.monotonic() < prazo:
+        time.sleep(0.01)
+    assert "Falha ao gravar o snapshot" in caplog.text
+    assert store._snapshotter.is_alive()
+    store.close()
+
+# Teste de escrita em lote quando o journal falha no meio dela
+def test_journaled_store_batch_failure(tmp_path, monkeypatch):
+    """
+    Testa que um lote interrompido por uma falha de fsync é recusado por
+    inteiro: nenhuma tarefa dele fica na memória e a versão não muda.
+    """
+    import os
+    import threading
+    from datetime import datetime, timezone
+    from app import journal
+    from app.journal import JournaledTaskStore
+
+    def nova(i):
+        return {"id": f"id-{i}", "titulo": f"T{i}", "descricao": None,
+                "estado": "pendente", "data_criacao": datetime.now(timezone.utc)}
+
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=False, snapshot_interval=3600)
+    store.add(nova(0))
+    store._journal.wait()
+
+    liberar = threading.Event()
+
+    def falhar(fd):
+        liberar.wait(timeout=5)
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(os, "fsync", falhar)
+    store.add(nova(1))  # A thread do journal fica presa no fsync desta escrita
+    versao = store.version()
+
+    # O fsync falha enquanto o lote ainda está sendo preparado
+    codificar, chamadas = journal.encode_record, []
+
+    def codificar_e_falhar(record):
+        chamadas.append(record.id)
+        if len(chamadas) == 100:
+            liberar.set()
+            store._journal._thread.join(timeout=5)
+        return codificar(record)
+
+    monkeypatch.setattr(journal, "encode_record", codificar_e_falhar)
+    with pytest.raises(RuntimeError):
+        store.add_many([nova(i) for i in range(2, 1002)])
+    assert len(chamadas) == 1000
+    assert len(store) == 2 and store.version() == versao
+    assert store.get("id-2") is None and store._journal._pending == []
+    store.close()
+
+# Teste de snapshot gravado enquanto outras escritas acontecem
+def test_journaled_store_snapshot_during_writes(tmp_path, monkeypatch):
+    """
+    Testa que um snapshot feito com escritas concorrentes, seguido do
+    restante do journal, recupera exatamente o estado final.
+    """
+    import threading
+    from datetime import datetime, timedelta, timezone
+    from app import storage
+    from app.journal import JournaledTaskStore
+
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def nova(i):
+        return {"id": f"id-{i:04d}", "titulo": f"T{i}", "descricao": None,
+                "estado": "pendente", "data_criacao": base + timedelta(seconds=i)}
+
+    monkeypatch.setattr(storage, "COPY_CHUNK", 7)  # Cópia em muitos trechos, intercalada com as escritas
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=False, snapshot_interval=3600)
+    store.add_many([nova(i) for i in range(500)])
+    parar = threading.Event()
+
+    def escrever():
+        i = 500
+        while not parar.is_set() or i < 700:
+            store.add(nova(i))
+            store.update(f"id-{i - 250:04d}", {"estado": "concluída", "data_atualizacao": base + timedelta(days=1, seconds=i)})
+            store.delete(f"id-{i - 500:04d}")
+            i += 1
+
+    escritor = threading.Thread(target=escrever)
+    escritor.start()
+    store.snapshot()
+    parar.set()
+    escritor.join()
+    esperado = list(store)
+    store.close()
+
+    store = JournaledTaskStore(str(tmp_path), wait_for_sync=False, snapshot_interval=3600)
+    assert list(store) == esperado
+    for ordem in ("data_criacao", "data_atualizacao"):
+        for estado in (None, "pendente", "concluída"):
+            pagina = store.page(1000, estado=estado, ordenar_por=ordem)
+            assert [t["id"] for t in pagina] == [
+                t["id"] for t in sorted((t for t in esperado if estado in (None, t["estado"])),
+                                        key=lambda t: (storage.sort_value(t, ordem), t["id"]))]
+    store.close()